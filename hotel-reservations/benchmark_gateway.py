@@ -0,0 +1,141 @@
+"""Compare catalog read throughput served directly by the services and through the nginx gateway.
+
+Each path is first sent once to its own service and once to the gateway; only
+paths that answer 2xx on both are benchmarked, so the two runs cover the same
+requests. Each run then gets the same closed-loop load: ``--concurrency``
+threads with keep-alive sessions request the paths round-robin for
+``--duration`` seconds. Throughput counts 2xx responses only; anything else is
+reported as errors. The gateway's X-Cache-Status header shows how many
+responses came from its micro-cache.
+
+    python benchmark_gateway.py --gateway http://localhost:8081 --paths /hotels,/hotels/1,/rooms/hotel/1
+"""
+import argparse
+import itertools
+import statistics
+import threading
+import time
+from collections import Counter
+
+import requests
+
+DEFAULT_SERVICES = ('users=http://localhost:5000,login=http://localhost:5000,hotels=http://localhost:5001,'
+                    'rooms=http://localhost:5002,reservations=http://localhost:5003,payments=http://localhost:5004')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def parse_services(value):
+    services = {}
+    for part in value.split(','):
+        prefix, _, url = part.partition('=')
+        services[prefix.strip()] = url.strip().rstrip('/')
+    return services
+
+
+def direct_url(services, path):
+    # /rooms/hotel/1 belongs to room-service, /hotels/1 to hotel-service, and so on.
+    prefix = path.lstrip('/').split('/', 1)[0].split('?', 1)[0]
+    if prefix not in services:
+        raise SystemExit(f"No service configured for {path}; add {prefix}=<url> to --services")
+    return services[prefix] + path
+
+
+def usable_paths(paths, services, gateway):
+    usable = []
+    for path in paths:
+        statuses = []
+        for url in (direct_url(services, path), gateway + path):
+            try:
+                statuses.append(requests.get(url, timeout=10).status_code)
+            except requests.RequestException as e:
+                statuses.append(type(e).__name__)
+        if all(isinstance(status, int) and 200 <= status < 300 for status in statuses):
+            usable.append(path)
+        else:
+            print(f"Skipping {path}: direct {statuses[0]}, gateway {statuses[1]}")
+    return usable
+
+
+def run(urls, concurrency, duration):
+    latencies = []
+    errors = Counter()
+    cache = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        local_latencies, local_errors, local_cache = [], Counter(), Counter()
+        for url in itertools.islice(itertools.cycle(urls), offset, None):
+            if time.perf_counter() >= deadline:
+                break
+            started = time.perf_counter()
+            try:
+                response = session.get(url, timeout=10)
+            except requests.RequestException as e:
+                local_errors[type(e).__name__] += 1
+                continue
+            if 200 <= response.status_code < 300:
+                local_latencies.append(time.perf_counter() - started)
+                local_cache[response.headers.get('X-Cache-Status', '-')] += 1
+            else:
+                local_errors[response.status_code] += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.update(local_errors)
+            cache.update(local_cache)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, errors, cache
+
+
+def report(name, elapsed, latencies, errors, cache):
+    if not latencies:
+        print(f"{name:>8}: no successful responses  errors {dict(errors)}")
+        return 0.0
+    millis = [latency * 1000 for latency in latencies]
+    throughput = len(latencies) / elapsed
+    print(f"{name:>8}: {throughput:9.1f} req/s  mean {statistics.mean(millis):7.2f} ms  "
+          f"p50 {percentile(millis, 0.5):7.2f} ms  p99 {percentile(millis, 0.99):7.2f} ms  "
+          f"errors {dict(errors)}  cache {dict(cache)}")
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gateway', default='http://localhost:8081', help='nginx gateway base URL')
+    parser.add_argument('--services', type=parse_services, default=parse_services(DEFAULT_SERVICES),
+                        help='first path segment to service base URL, for the direct run')
+    parser.add_argument('--paths', default='/hotels,/hotels/1,/rooms,/rooms/hotel/1',
+                        help='comma-separated catalog paths requested round-robin')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    args = parser.parse_args()
+    gateway = args.gateway.rstrip('/')
+
+    paths = usable_paths([path for path in args.paths.split(',') if path], args.services, gateway)
+    if not paths:
+        raise SystemExit("No path answered 2xx both directly and through the gateway")
+    print(f"Benchmarking {', '.join(paths)}")
+
+    results = {}
+    for name, urls in (('direct', [direct_url(args.services, path) for path in paths]),
+                       ('gateway', [gateway + path for path in paths])):
+        run(urls, args.concurrency, args.warmup)
+        results[name] = report(name, *run(urls, args.concurrency, args.duration))
+    if results['direct']:
+        print(f"gateway / direct throughput: {results['gateway'] / results['direct']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
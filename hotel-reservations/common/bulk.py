@@ -0,0 +1,188 @@
+"""Streaming bulk imports: NDJSON or CSV rows in, inserted counts and per-row errors out."""
+import csv
+import json
+import os
+
+from prometheus_client import Counter
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError
+
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+BULK_MAX_ERRORS = int(os.getenv('BULK_MAX_ERRORS', '1000'))
+# Ids per lookup request, keeping query strings well under gunicorn's request line limit.
+BULK_LOOKUP_CHUNK = int(os.getenv('BULK_LOOKUP_CHUNK', '300'))
+
+bulk_rows_total = Counter('bulk_rows_total', 'Rows received by bulk imports', ['table', 'result'])
+
+
+class RowError(Exception):
+    pass
+
+
+def _lines(stream, block_size=65536):
+    # Iterating the WSGI input directly reads it a byte at a time; split blocks instead.
+    pending = b''
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode('utf-8', errors='replace') + '\n'
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+
+def read_rows(req):
+    """Yield ``(line, record)`` pairs from the request body without buffering it.
+
+    ``text/csv`` bodies are read with a header row; anything else is treated as
+    NDJSON. A line that cannot be parsed yields a ``RowError`` as its record.
+    """
+    lines = _lines(req.stream)
+    if req.mimetype == 'text/csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, {key: value for key, value in record.items() if key is not None}
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f"Invalid JSON: {e}")
+            continue
+        yield number, record if isinstance(record, dict) else RowError("Expected a JSON object")
+
+
+def chunks(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_get(client, path, ids):
+    """Call a ``GET <path>?ids=...`` batch endpoint ``BULK_LOOKUP_CHUNK`` ids at a time.
+
+    Returns the decoded body of every chunk; raises ``requests.HTTPError`` when
+    any chunk fails.
+    """
+    bodies = []
+    for batch in chunks(sorted(set(ids)), BULK_LOOKUP_CHUNK):
+        response = client.get(path, params={'ids': ','.join(str(i) for i in batch)})
+        response.raise_for_status()
+        bodies.append(response.json())
+    return bodies
+
+
+def existing_ids(client, path, ids):
+    """Return the subset of ``ids`` that a ``GET <path>?ids=...`` batch endpoint knows about."""
+    return {item['id'] for body in batch_get(client, path, ids) for item in body}
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('true', '1', 'yes'):
+        return True
+    if text in ('false', '0', 'no'):
+        return False
+    raise RowError(f"Invalid boolean {value!r}")
+
+
+def required_text(record, field):
+    value = record[field]
+    if not isinstance(value, str) or not value.strip():
+        raise RowError(f"{field} must be a non-empty string")
+    return value.strip()
+
+
+def describe(error):
+    if isinstance(error, KeyError):
+        return f"Missing field {error.args[0]!r}"
+    if isinstance(error, DBAPIError) and error.orig is not None:
+        return str(error.orig).strip().splitlines()[0]
+    return str(error)
+
+
+class ImportReport:
+    def __init__(self, table):
+        self.table = table
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < BULK_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self):
+        bulk_rows_total.labels(self.table, 'inserted').inc(self.inserted)
+        bulk_rows_total.labels(self.table, 'failed').inc(self.failed)
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+def _insert(session, model, rows, report):
+    try:
+        session.execute(insert(model.__table__), [values for _, values in rows])
+        session.commit()
+        report.inserted += len(rows)
+        return
+    except DBAPIError:
+        session.rollback()
+    # Something in the chunk was rejected; insert row by row to find out which.
+    for line, values in rows:
+        try:
+            with session.begin_nested():
+                session.execute(insert(model.__table__), [values])
+            report.inserted += 1
+        except DBAPIError as e:
+            report.error(line, describe(e))
+    session.commit()
+
+
+def bulk_import(session, model, rows, parse_row, check_batch=None, batch_size=BULK_BATCH_SIZE):
+    """Validate and insert streamed ``(line, record)`` rows in chunked transactions.
+
+    ``parse_row(record)`` returns the column values for one row; ``KeyError``,
+    ``TypeError``, ``ValueError`` and ``RowError`` become errors for that line.
+    ``check_batch(values_list)`` runs once per batch for lookups that need other
+    services and returns an error message or ``None`` for each row. Every batch
+    is written with multi-row inserts and committed on its own.
+    """
+    report = ImportReport(model.__tablename__)
+    for batch in chunks(rows, batch_size):
+        parsed = []
+        for line, record in batch:
+            try:
+                if isinstance(record, RowError):
+                    raise record
+                parsed.append((line, parse_row(record)))
+            except (KeyError, TypeError, ValueError, RowError) as e:
+                report.error(line, describe(e))
+        if parsed and check_batch is not None:
+            try:
+                problems = check_batch([values for _, values in parsed])
+            except Exception as e:
+                problems = [f"Validation failed: {e}"] * len(parsed)
+            for (line, _), problem in zip(parsed, problems):
+                if problem:
+                    report.error(line, problem)
+            parsed = [row for row, problem in zip(parsed, problems) if not problem]
+        if parsed:
+            _insert(session, model, parsed, report)
+    return report.to_dict()
@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from flask import jsonify, request
+from prometheus_client import Counter, Gauge
+
+from common.fanout import get_executor
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://redis:6379/0')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+CACHE_TTL_SECONDS = float(os.getenv('CACHE_TTL_SECONDS', '300'))
+CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv('CACHE_NEGATIVE_TTL_SECONDS', '10'))
+CACHE_INVALIDATION_PEERS = os.getenv('CACHE_INVALIDATION_PEERS', '')
+CACHE_INVALIDATION_TIMEOUT = float(os.getenv('CACHE_INVALIDATION_TIMEOUT', '1.0'))
+
+cache_requests_total = Counter('cache_requests_total', 'Entity cache lookups', ['cache', 'result'])
+cache_evictions_total = Counter('cache_evictions_total', 'Entries evicted from a full in-process cache', ['cache'])
+cache_invalidations_total = Counter('cache_invalidations_total', 'Entity cache keys invalidated', ['cache'])
+cache_broadcasts_total = Counter('cache_broadcasts_total', 'Invalidation messages sent to peers', ['cache', 'status'])
+cache_entries = Gauge('cache_entries', 'Entries held by an in-process cache', ['cache'], multiprocess_mode='livesum')
+
+MISSING = object()
+
+
+class LocalBackend:
+    """Bounded in-process LRU map whose entries expire after their own TTL.
+
+    ``token`` and ``set(..., token)`` let a loader store its value only if no
+    invalidation happened since it started; any invalidation counts.
+    """
+
+    def __init__(self, name, max_entries=CACHE_MAX_ENTRIES):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = cache_entries.labels(name)
+        self._generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._size.set(len(self._entries))
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def token(self, key):
+        return self._generation
+
+    def set(self, key, value, ttl, token=None):
+        with self._lock:
+            if token is not None and token != self._generation:
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                cache_evictions_total.labels(self.name).inc()
+            self._size.set(len(self._entries))
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+            self._size.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size.set(0)
+
+
+class RedisBackend:
+    """Store shared by all replicas; values are kept as JSON with a Redis expiry.
+
+    Every key has a version counter in Redis, bumped by ``delete``, and the
+    cache has a generation, bumped by ``clear``. ``set(..., token)`` writes
+    under WATCH on both, so a loader in any worker or replica that started
+    before an invalidation cannot store its value afterwards.
+    """
+
+    # Long enough to outlive any load that read the version before it expires.
+    VERSION_TTL_MS = 3600 * 1000
+
+    def __init__(self, name, url=CACHE_REDIS_URL):
+        import redis
+        self.name = name
+        self._client = redis.Redis.from_url(url)
+        self._watch_error = redis.WatchError
+
+    def _version_keys(self, key):
+        return [f'{self.name}!generation', f'{key}:version']
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def token(self, key):
+        return self._client.mget(self._version_keys(key))
+
+    def set(self, key, value, ttl, token=None):
+        data, expiry = json.dumps(value), max(int(ttl * 1000), 1)
+        if token is None:
+            self._client.set(key, data, px=expiry)
+            return True
+        version_keys = self._version_keys(key)
+        with self._client.pipeline() as pipe:
+            try:
+                pipe.watch(*version_keys)
+                if pipe.mget(version_keys) != token:
+                    return False
+                pipe.multi()
+                pipe.set(key, data, px=expiry)
+                pipe.execute()
+                return True
+            except self._watch_error:
+                return False
+
+    def delete(self, key):
+        version_key = self._version_keys(key)[1]
+        with self._client.pipeline() as pipe:
+            pipe.incr(version_key)
+            pipe.pexpire(version_key, self.VERSION_TTL_MS)
+            pipe.delete(key)
+            pipe.execute()
+
+    def clear(self):
+        self._client.incr(f'{self.name}!generation')
+        for key in self._client.scan_iter(match=f'{self.name}:*'):
+            self._client.delete(key)
+
+
+def make_backend(name):
+    if CACHE_BACKEND == 'redis':
+        return RedisBackend(name)
+    return LocalBackend(name)
+
+
+class EntityCache:
+    """Read-through cache for entities owned by another service.
+
+    ``loader(key)`` returns the entity, ``None`` when it does not exist (cached
+    for ``negative_ttl``), or raises, in which case nothing is cached. Keys are
+    normalised to strings so ``5`` and ``"5"`` share an entry.
+    """
+
+    def __init__(self, name, loader, ttl=CACHE_TTL_SECONDS, negative_ttl=CACHE_NEGATIVE_TTL_SECONDS, backend=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend or make_backend(name)
+
+    def _key(self, key):
+        return f'{self.name}:{key}'
+
+    def get(self, key):
+        try:
+            cached = self.backend.get(self._key(key))
+            if cached is not MISSING:
+                cache_requests_total.labels(self.name, 'hit' if cached is not None else 'negative_hit').inc()
+                return cached
+            token = self.backend.token(self._key(key))
+        except Exception as e:
+            logger.warning("Cache %s unavailable, loading %s directly: %s", self.name, key, e)
+            token = MISSING
+
+        cache_requests_total.labels(self.name, 'miss').inc()
+        value = self.loader(key)
+        if token is not MISSING:
+            # An invalidation that arrived while loading may concern this value; the token makes the backend refuse it.
+            try:
+                self.backend.set(self._key(key), value, self.ttl if value is not None else self.negative_ttl, token)
+            except Exception as e:
+                logger.warning("Cache %s unavailable, not storing %s: %s", self.name, key, e)
+        return value
+
+    def invalidate(self, key):
+        self.backend.delete(self._key(key))
+        cache_invalidations_total.labels(self.name).inc()
+
+    def clear(self):
+        self.backend.clear()
+
+
+def http_loader(client):
+    """Loader fetching ``GET <base_url>/<key>`` with a ``ServiceClient``; 404 means the entity does not exist."""
+    def load(key):
+        response = client.get(f'/{key}')
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+    return load
+
+
+def init_cache_invalidation(app, *caches):
+    """Register ``POST /cache/invalidate`` so owning services can evict entries."""
+    caches_by_name = {cache.name: cache for cache in caches}
+
+    @app.route('/cache/invalidate', methods=['POST'])
+    def invalidate_cache():
+        data = request.get_json(silent=True) or {}
+        cache = caches_by_name.get(data.get('cache'))
+        if cache is None:
+            return jsonify({"error": "Unknown cache"}), 404
+        keys = data.get('keys', [])
+        for key in keys:
+            cache.invalidate(key)
+        return jsonify({"invalidated": len(keys)}), 200
+
+
+class InvalidationBroadcaster:
+    """Tells every replica of every peer service to drop changed entities.
+
+    Peers are base URLs such as ``http://tasks.room-service:5002``; the
+    ``tasks.`` name resolves to one address per replica, so each replica's
+    cache is reached rather than one picked by the service VIP. Messages are
+    sent in the background and failures are only logged; the TTL bounds how
+    long a replica that missed one can serve a stale entry.
+    """
+
+    def __init__(self, peers=None, timeout=CACHE_INVALIDATION_TIMEOUT):
+        if peers is None:
+            peers = [peer.strip() for peer in CACHE_INVALIDATION_PEERS.split(',') if peer.strip()]
+        self.peers = peers
+        self.timeout = timeout
+
+    def _targets(self):
+        for peer in self.peers:
+            parts = urlsplit(peer)
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            try:
+                addresses = sorted({info[4][0] for info in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)})
+            except socket.gaierror as e:
+                logger.warning("Cannot resolve cache peer %s: %s", peer, e)
+                continue
+            for address in addresses:
+                host = f'[{address}]' if ':' in address else address
+                yield urlunsplit((parts.scheme, f'{host}:{port}', '/cache/invalidate', '', ''))
+
+    def _send(self, cache, keys):
+        for url in self._targets():
+            try:
+                response = requests.post(url, json={'cache': cache, 'keys': keys}, timeout=self.timeout)
+                cache_broadcasts_total.labels(cache, str(response.status_code)).inc()
+            except requests.RequestException as e:
+                cache_broadcasts_total.labels(cache, 'error').inc()
+                logger.warning("Cache invalidation to %s failed: %s", url, e)
+
+    def publish(self, cache, *keys):
+        if self.peers and keys:
+            get_executor().submit(self._send, cache, list(keys))
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from common.tracing import with_active_span
+
+FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', '16'))
+FANOUT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT', '5.0'))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+class CallResult:
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def value_or(self, default):
+        return self.value if self.error is None else default
+
+
+def fan_out(calls, timeout=None):
+    """Run independent calls concurrently on the shared bounded pool.
+
+    ``calls`` maps a name to either a zero-argument callable or a
+    ``(callable, timeout)`` pair. Every call gets its own deadline, measured
+    from submission; calls that raise or miss their deadline are reported in
+    the returned ``CallResult`` instead of failing the whole fan-out.
+    """
+    default_timeout = timeout if timeout is not None else FANOUT_TIMEOUT
+    executor = get_executor()
+    started = time.monotonic()
+
+    pending = {}
+    for name, call in calls.items():
+        call_timeout = default_timeout
+        if isinstance(call, tuple):
+            call, call_timeout = call
+        pending[name] = (executor.submit(with_active_span(call)), started + call_timeout)
+
+    results = {}
+    for name, (future, deadline) in pending.items():
+        try:
+            results[name] = CallResult(value=future.result(timeout=max(0, deadline - time.monotonic())))
+        except FutureTimeoutError:
+            future.cancel()
+            results[name] = CallResult(error=TimeoutError(f"{name} did not complete before its deadline"))
+        except Exception as e:
+            results[name] = CallResult(error=e)
+    return results
@@ -0,0 +1,126 @@
+"""HTTP validators, conditional GETs and response compression for read-mostly endpoints."""
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import g, make_response, request
+from prometheus_client import Counter
+from sqlalchemy import text
+
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '5'))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '5'))
+COMPRESS_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain'}
+
+conditional_requests_total = Counter(
+    'conditional_requests_total', 'GET requests to endpoints with validators', ['endpoint', 'result'])
+compressed_responses_total = Counter('compressed_responses_total', 'Responses sent gzip-compressed')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def version_tracking(table):
+    """Migration steps keeping ``table_versions`` in step with every write to ``table``.
+
+    A statement-level trigger bumps the table's counter in the writing
+    transaction, so inserts through the ORM, bulk imports and manual SQL
+    are all covered.
+    """
+    return [
+        "CREATE TABLE IF NOT EXISTS table_versions ("
+        "name text PRIMARY KEY, version bigint NOT NULL DEFAULT 0, updated_at timestamptz NOT NULL DEFAULT now())",
+        "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ BEGIN "
+        "INSERT INTO table_versions (name, version, updated_at) VALUES (TG_TABLE_NAME, 1, now()) "
+        "ON CONFLICT (name) DO UPDATE SET version = table_versions.version + 1, updated_at = now(); "
+        "RETURN NULL; END $$ LANGUAGE plpgsql",
+        f"INSERT INTO table_versions (name) VALUES ('{table}') ON CONFLICT (name) DO NOTHING",
+        f"DROP TRIGGER IF EXISTS {table}_version ON {table}",
+        f"CREATE TRIGGER {table}_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    ]
+
+
+def table_versions(session, tables):
+    """Return the ETag and Last-Modified for ``tables``.
+
+    Last-Modified has one-second resolution, so while the database clock is
+    still in the second of the last write it is ``None``: another write in the
+    same second would carry the same date, and a copy validated by it could be
+    stale.
+    """
+    rows = session.execute(
+        text("SELECT name, version, updated_at, clock_timestamp() FROM table_versions WHERE name = ANY(:names)"),
+        {'names': list(tables)}
+    ).all()
+    versions = {name: (version, updated_at) for name, version, updated_at, _ in rows}
+    tag = '.'.join(f"{table}{versions.get(table, (0,))[0]}" for table in tables)
+    modified = max((updated_at for _, updated_at in versions.values()), default=EPOCH).replace(microsecond=0)
+    if rows and modified + timedelta(seconds=1) > rows[0][3]:
+        return tag, None
+    return tag, modified
+
+
+def _not_modified(etag, modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return modified is not None and request.if_modified_since is not None and request.if_modified_since >= modified
+
+
+def _set_validators(response, etag, modified, max_age):
+    response.set_etag(etag, weak=True)
+    if modified is not None:
+        response.last_modified = modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+def conditional_get(db, *tables, max_age=None):
+    """Give a GET view an ETag and Last-Modified derived from ``tables``' versions.
+
+    The versions are checked before the view runs, so a request whose
+    ``If-None-Match`` or ``If-Modified-Since`` is still current gets a 304
+    without querying or serializing anything. The tag is weak because the
+    same version may be sent gzip-compressed or not.
+    """
+    max_age = CATALOG_MAX_AGE if max_age is None else max_age
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, modified = table_versions(db.session, tables)
+            g.table_version = etag
+            if _not_modified(etag, modified):
+                conditional_requests_total.labels(request.endpoint, 'not_modified').inc()
+                return _set_validators(make_response('', 304), etag, modified, max_age)
+            conditional_requests_total.labels(request.endpoint, 'full').inc()
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, modified, max_age)
+            return response
+        return wrapper
+    return decorator
+
+
+def init_compression(app, min_size=None, level=None):
+    """Gzip buffered text responses larger than ``min_size`` for clients that accept it."""
+    min_size = COMPRESS_MIN_SIZE if min_size is None else min_size
+    level = COMPRESS_LEVEL if level is None else level
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in response.headers):
+            return response
+        # Shared caches must keep compressed and plain copies apart, whichever one this is.
+        response.vary.add('Accept-Encoding')
+        if 'gzip' not in request.headers.get('Accept-Encoding', ''):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=level))
+        response.headers['Content-Encoding'] = 'gzip'
+        compressed_responses_total.inc()
+        return response
@@ -0,0 +1,181 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+from prometheus_client import Counter, Histogram
+
+from common.tracing import client_span
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '1.0'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '5.0'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.05'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+downstream_requests_total = Counter(
+    'downstream_requests_total', 'Total HTTP requests to downstream services',
+    ['downstream', 'method', 'status'])
+downstream_request_duration_seconds = Histogram(
+    'downstream_request_duration_seconds', 'Duration of HTTP requests to downstream services',
+    ['downstream', 'method'])
+downstream_retries_total = Counter(
+    'downstream_retries_total', 'Retried HTTP requests to downstream services',
+    ['downstream', 'method'])
+downstream_revalidations_total = Counter(
+    'downstream_revalidations_total', 'Conditional GETs to downstream services',
+    ['downstream', 'result'])
+
+
+class ValidatorCache:
+    """Remembers the last ``ETag``/``Last-Modified`` response per URL so it can be revalidated.
+
+    Holds at most ``max_entries`` responses, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class ServiceClient:
+    """Pooled, keep-alive HTTP client for a single downstream service.
+
+    Idempotent requests are retried on connection errors and gateway errors
+    with exponential backoff and full jitter; other methods are sent once.
+    With ``validator_cache`` set to a size, GET responses carrying validators
+    are kept and later requests for the same URL are sent conditionally; a 304
+    is answered with the kept response.
+    """
+
+    def __init__(self, name, base_url, connect_timeout=None, read_timeout=None,
+                 max_retries=None, pool_maxsize=None, validator_cache=0):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else HTTP_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT,
+        )
+        self.max_retries = max_retries if max_retries is not None else HTTP_MAX_RETRIES
+        self.pool_maxsize = pool_maxsize or HTTP_POOL_MAXSIZE
+        self.validators = ValidatorCache(validator_cache) if validator_cache else None
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Sessions hold open sockets, so a forked worker must not reuse its parent's pool.
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def url(self, path=''):
+        if not path:
+            return self.base_url
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path='', **kwargs):
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.url(path)
+        headers = dict(kwargs.pop('headers', None) or {})
+
+        if method == 'GET' and self.validators is not None and not kwargs.get('stream'):
+            return self._conditional_get(url, headers, **kwargs)
+        return self._traced_send(method, url, headers, **kwargs)
+
+    def _traced_send(self, method, url, headers, **kwargs):
+        with client_span(f"{self.name} {method}", method, url, headers) as span:
+            response = self._send(method, url, headers=headers, **kwargs)
+            if span is not None:
+                span.set_tag('http.status_code', response.status_code)
+            return response
+
+    def _conditional_get(self, url, headers, **kwargs):
+        params = kwargs.get('params')
+        key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        cached = self.validators.get(key)
+        if cached is not None:
+            if cached.headers.get('ETag'):
+                headers['If-None-Match'] = cached.headers['ETag']
+            if cached.headers.get('Last-Modified'):
+                headers['If-Modified-Since'] = cached.headers['Last-Modified']
+        response = self._traced_send('GET', url, headers, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            downstream_revalidations_total.labels(self.name, 'not_modified').inc()
+            return cached
+        if cached is not None:
+            downstream_revalidations_total.labels(self.name, 'modified').inc()
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            self.validators.put(key, response)
+        else:
+            self.validators.discard(key)
+        return response
+
+    def _send(self, method, url, **kwargs):
+        attempts = 1 + (self.max_retries if method in IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._observe(method, 'error', start)
+                if last_attempt:
+                    raise
+            else:
+                self._observe(method, response.status_code, start)
+                if last_attempt or response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+            downstream_retries_total.labels(self.name, method).inc()
+            time.sleep(random.uniform(0, HTTP_RETRY_BACKOFF * (2 ** attempt)))
+
+    def _observe(self, method, status, start):
+        downstream_request_duration_seconds.labels(self.name, method).observe(time.perf_counter() - start)
+        downstream_requests_total.labels(self.name, method, str(status)).inc()
+
+    def get(self, path='', **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path='', **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path='', **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def delete(self, path='', **kwargs):
+        return self.request('DELETE', path, **kwargs)
@@ -0,0 +1,119 @@
+"""Serve a service's Flask app with gunicorn.
+
+    python -m common.launcher app:app 0.0.0.0:5001
+
+Workers, threads and the worker class come from ``WEB_*`` environment
+variables. With ``WEB_PRELOAD=true`` (the default) the app is imported once in
+the master, so startup work such as migrations runs once per container, and
+workers are forked from it; anything holding sockets or threads must then be
+re-created in each worker through ``after_fork``. ``kill -HUP`` on the master
+replaces the workers gracefully.
+
+Prometheus runs in multiprocess mode: each worker writes its samples under
+``PROMETHEUS_MULTIPROC_DIR``, which is emptied when the master starts.
+"""
+import importlib
+import os
+import sys
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+_after_fork_hooks = []
+# Set by ``main`` when gunicorn imports the app in the master and forks workers from it.
+preloaded = False
+
+
+def after_fork(hook):
+    """Register ``hook`` to run in every worker right after it is forked from the master."""
+    _after_fork_hooks.append(hook)
+    return hook
+
+
+def start_in_workers(hook):
+    """Run ``hook`` in the processes that serve requests, and never in a preloading master.
+
+    Under a preloading gunicorn it runs in every worker after the fork;
+    otherwise (no preload, ``flask run``, scripts) it runs right away.
+    """
+    if preloaded:
+        after_fork(hook)
+    else:
+        hook()
+    return hook
+
+
+def run_after_fork_hooks():
+    for hook in _after_fork_hooks:
+        hook()
+
+
+def post_fork(server, worker):
+    # Under ``python -m`` this file runs as __main__, while the apps register
+    # their hooks on the importable common.launcher module.
+    from common.launcher import run_after_fork_hooks
+    run_after_fork_hooks()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def prepare_metrics_dir():
+    # Must happen before prometheus_client is imported, which decides then whether to use the directory.
+    path = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus-multiproc'))
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+
+
+def server_options(bind):
+    threads = int(os.getenv('WEB_THREADS', '4'))
+    return {
+        'bind': os.getenv('WEB_BIND', bind),
+        'workers': int(os.getenv('WEB_WORKERS', '2')),
+        'threads': threads,
+        'worker_class': os.getenv('WEB_WORKER_CLASS', 'gthread' if threads > 1 else 'sync'),
+        'worker_connections': int(os.getenv('WEB_WORKER_CONNECTIONS', '1000')),
+        'timeout': int(os.getenv('WEB_TIMEOUT', '30')),
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30')),
+        'keepalive': int(os.getenv('WEB_KEEPALIVE', '5')),
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', '0')),
+        'max_requests_jitter': int(os.getenv('WEB_MAX_REQUESTS_JITTER', '0')),
+        'preload_app': os.getenv('WEB_PRELOAD', 'true').lower() == 'true',
+        'accesslog': os.getenv('WEB_ACCESS_LOG') or None,
+        'post_fork': post_fork,
+        'child_exit': child_exit,
+    }
+
+
+class Launcher(BaseApplication):
+    def __init__(self, target, options):
+        self.target = target
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        module_name, _, attribute = self.target.partition(':')
+        return getattr(importlib.import_module(module_name), attribute or 'app')
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        raise SystemExit("usage: python -m common.launcher module:app [host:port]")
+    bind = argv[1] if len(argv) > 1 else '0.0.0.0:8000'
+    prepare_metrics_dir()
+    options = server_options(bind)
+    # The apps import common.launcher by name, while this file runs as __main__.
+    importlib.import_module('common.launcher').preloaded = options['preload_app']
+    Launcher(argv[0], options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+import opentracing
+from prometheus_client import Counter
+
+from common.launcher import after_fork
+
+SYSLOG_HOST = os.getenv('SYSLOG_HOST', 'rsyslog-server')
+SYSLOG_PORT = int(os.getenv('SYSLOG_PORT', '514'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', '100'))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '0.5'))
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+log_records_dropped_total = Counter('log_records_dropped_total', 'Log records dropped because the log queue was full', ['logger'])
+log_records_sampled_out_total = Counter('log_records_sampled_out_total', 'Log records skipped by sampling', ['logger'])
+log_records_undelivered_total = Counter(
+    'log_records_undelivered_total', 'Log records dropped because syslog could not be reached', ['logger'])
+
+# Attributes every LogRecord has; anything else was passed through ``extra=`` and is logged as a field.
+RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'trace_id', 'span_id'}
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records from noisy loggers.
+
+    Rates apply to a logger and its children; the most specific configured
+    name wins. Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if random.random() < self._rate(record.name):
+            return True
+        log_records_sampled_out_total.labels(record.name).inc()
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'service': self.service,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'trace_id', None):
+            entry['trace_id'] = record.trace_id
+            entry['span_id'] = record.span_id
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the shipper thread without ever waiting.
+
+    Only the cheap, context-dependent work happens on the calling thread:
+    merging the message arguments, rendering a traceback and capturing the
+    active trace ids. When the queue is full the record is dropped and
+    counted.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        span = opentracing.global_tracer().active_span
+        trace_id = getattr(span.context, 'trace_id', None) if span is not None else None
+        if trace_id:
+            record.trace_id = '{:x}'.format(trace_id)
+            record.span_id = '{:x}'.format(span.context.span_id)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.labels(record.name).inc()
+
+
+class SyslogBatchSender:
+    """Writes each batch of records to syslog over TCP in a single send.
+
+    Records are framed as newline-terminated syslog lines, which rsyslog's
+    imtcp input splits back into separate messages. The connection is opened
+    on first use and reopened once after an error; a batch that still cannot
+    be sent is dropped and counted.
+    """
+
+    def __init__(self, host, port, ident, formatter, timeout=2.0):
+        self.address = (host, port)
+        self.ident = ident
+        self.formatter = formatter
+        self.timeout = timeout
+        self._sock = None
+        self._pid = None
+
+    def _frame(self, record):
+        syslog = logging.handlers.SysLogHandler
+        severity = syslog.priority_names[syslog.priority_map.get(record.levelname, 'warning')]
+        priority = (syslog.LOG_USER << 3) | severity
+        return f'<{priority}>{self.ident}{self.formatter.format(record)}\n'.encode('utf-8')
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+
+    def send(self, records):
+        data = b''.join(self._frame(record) for record in records)
+        if self._pid != os.getpid():
+            # The parent's connection is shared with it after fork; open our own.
+            self._sock, self._pid = None, os.getpid()
+        for _ in range(2):
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(self.address, timeout=self.timeout)
+                self._sock.sendall(data)
+                return
+            except OSError:
+                self._close()
+        for record in records:
+            log_records_undelivered_total.labels(record.name).inc()
+
+
+class BatchingListener:
+    """Background thread that drains the log queue and hands each batch to the senders at once."""
+
+    def __init__(self, log_queue, senders, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.queue = log_queue
+        self.senders = senders
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = None
+        self._stop = object()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(self._stop)
+            self._thread.join(timeout=5)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not self._stop:
+            try:
+                batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stopping = batch[-1] is self._stop
+            records = batch[:-1] if stopping else batch
+            if records:
+                for sender in self.senders:
+                    sender.send(records)
+            if stopping:
+                return
+
+
+class LoggingPipeline:
+    def __init__(self, senders, queue_size=LOG_QUEUE_SIZE):
+        self.senders = senders
+        self.queue_size = queue_size
+        self.queue_handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        self.listener = None
+
+    def start(self):
+        # A fresh queue after fork: the parent's may hold locks taken by its shipper thread.
+        self.queue_handler.queue = queue.Queue(self.queue_size)
+        self.listener = BatchingListener(self.queue_handler.queue, self.senders)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+
+
+def init_logging(service, sample_rates=None):
+    """Return the service logger, shipping JSON records to syslog through a background thread.
+
+    ``sample_rates`` maps logger names to the fraction of their info/debug
+    records to keep; ``LOG_SAMPLE_RATES`` (``name=rate,...``) overrides it.
+    """
+    pipeline = LoggingPipeline([SyslogBatchSender(SYSLOG_HOST, SYSLOG_PORT, f'{service}: ', JsonFormatter(service))])
+    rates = dict(sample_rates or {})
+    rates.update(parse_sample_rates(LOG_SAMPLE_RATES))
+    pipeline.queue_handler.addFilter(SamplingFilter(rates))
+    pipeline.start()
+    after_fork(pipeline.start)
+    atexit.register(pipeline.stop)
+
+    logger = logging.getLogger(service)
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(pipeline.queue_handler)
+    return logger
@@ -0,0 +1,120 @@
+import os
+import time
+
+from flask import Response, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SQL_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+http_requests_total = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint'])
+http_request_duration_seconds = Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests',
+    ['method', 'endpoint', 'status'])
+http_requests_in_progress = Gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled',
+    ['method', 'endpoint'], multiprocess_mode='livesum')
+db_query_duration_seconds = Histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements',
+    ['operation', 'endpoint'], buckets=DB_BUCKETS)
+db_pool_checked_out = Gauge(
+    'db_pool_checked_out', 'Database connections currently checked out of the pool',
+    multiprocess_mode='livesum')
+db_pool_connections_total = Counter('db_pool_connections_total', 'Database connections opened by the pool')
+db_pool_invalidations_total = Counter('db_pool_invalidations_total', 'Pooled database connections invalidated')
+
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else 'background'
+
+
+def _operation(statement):
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ''
+    return operation if operation in SQL_OPERATIONS else 'OTHER'
+
+
+def instrument_engine(engine):
+    # Imported here so services without a database do not need SQLAlchemy installed.
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        db_query_duration_seconds.labels(_operation(statement), _endpoint()).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        # after_cursor_execute is skipped when a statement fails, so drop its start time here.
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_started'):
+            conn.info['query_started'].pop()
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        db_pool_connections_total.inc()
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        db_pool_checked_out.inc()
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        db_pool_checked_out.dec()
+
+    @event.listens_for(engine, 'invalidate')
+    def invalidate(dbapi_connection, connection_record, exception):
+        db_pool_invalidations_total.inc()
+
+
+def init_metrics(app, db=None):
+    """Record request, latency and database metrics for ``app`` and serve them on ``/metrics``.
+
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set (the launcher sets it for
+    gunicorn), every worker writes its samples to that directory and
+    ``/metrics`` aggregates all of them, whichever worker answers the scrape.
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        endpoint = request.endpoint or 'unmatched'
+        http_requests_total.labels(request.method, endpoint).inc()
+        http_requests_in_progress.labels(request.method, endpoint).inc()
+        request.environ['metrics.started'] = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = request.environ.get('metrics.started')
+        if started is not None:
+            http_request_duration_seconds.labels(
+                request.method, request.endpoint or 'unmatched', str(response.status_code)
+            ).observe(time.perf_counter() - started)
+            request.environ['metrics.observed'] = True
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error):
+        started = request.environ.pop('metrics.started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        if not request.environ.pop('metrics.observed', False):
+            # after_request did not run, so the request ended with an unhandled exception.
+            http_request_duration_seconds.labels(request.method, endpoint, '500').observe(time.perf_counter() - started)
+        http_requests_in_progress.labels(request.method, endpoint).dec()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+    if db is not None:
+        with app.app_context():
+            instrument_engine(db.engine)
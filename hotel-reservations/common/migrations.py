@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+
+import click
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'true').lower() == 'true'
+
+
+class Migration:
+    """One schema step, applied at most once per database.
+
+    ``steps`` are SQL strings or callables taking a connection. A callable that
+    returns ``False`` leaves the migration pending so it is retried on the next
+    run, which lets a step wait for data that has to be fixed by hand first.
+    """
+
+    def __init__(self, version, name, *steps):
+        self.version = version
+        self.name = name
+        self.steps = steps
+
+    def apply(self, conn):
+        for step in self.steps:
+            if callable(step):
+                if step(conn) is False:
+                    return False
+            else:
+                conn.execute(text(step))
+        return True
+
+
+class QueryPlan:
+    def __init__(self, name, sql, params=None):
+        self.name = name
+        self.sql = sql
+        self.params = params or {}
+
+
+def run_migrations(engine, service, migrations):
+    # All replicas start together, so a transaction-scoped advisory lock makes
+    # exactly one of them apply pending steps while the others wait.
+    applied_now = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {'key': f'{service}-migrations'})
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version integer PRIMARY KEY, name text NOT NULL, applied_at timestamptz NOT NULL DEFAULT now())"
+        ))
+        applied = {version for version, in conn.execute(text("SELECT version FROM schema_migrations"))}
+        for migration in sorted(migrations, key=lambda migration: migration.version):
+            if migration.version in applied:
+                continue
+            if not migration.apply(conn):
+                logger.warning("Migration %d (%s) left pending", migration.version, migration.name)
+                continue
+            conn.execute(text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                         {'version': migration.version, 'name': migration.name})
+            applied_now.append(migration)
+    for migration in applied_now:
+        logger.info("Applied migration %d (%s)", migration.version, migration.name)
+    return applied_now
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def _is_full_scan(node):
+    # An index scan without an index condition walks the whole index, e.g. the
+    # primary key used only for ORDER BY, which is a sequential scan in disguise.
+    if node['Node Type'] == 'Seq Scan':
+        return True
+    return node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node
+
+
+def check_query_plans(engine, query_plans):
+    """Return ``(name, table)`` pairs for hot queries that need a full table scan.
+
+    Sequential scans are disabled for the check, so on small tables the planner
+    still picks an index whenever one can serve the query; a sequential or
+    unconditioned index scan in the plan therefore means no usable index exists.
+    """
+    failures = []
+    with engine.connect() as conn:
+        for query_plan in query_plans:
+            with conn.begin():
+                conn.execute(text("SET LOCAL enable_seqscan = off"))
+                result = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query_plan.sql}"), query_plan.params).scalar()
+                plan = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+            for node in _plan_nodes(plan):
+                if _is_full_scan(node):
+                    failures.append((query_plan.name, node.get('Relation Name')))
+    return failures
+
+
+def init_migrations(app, db, service, migrations, query_plans=()):
+    """Apply pending migrations on startup and register the ``migrate`` and ``check-plans`` commands."""
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending schema migrations."""
+        applied = run_migrations(db.engine, service, migrations)
+        click.echo(f"Applied {len(applied)} migration(s)")
+
+    @app.cli.command('check-plans')
+    def check_plans_command():
+        """Fail if a hot query falls back to a sequential scan."""
+        failures = check_query_plans(db.engine, query_plans)
+        for name, table in failures:
+            click.echo(f"FAIL {name}: sequential scan on {table}", err=True)
+        if failures:
+            raise SystemExit(1)
+        click.echo(f"All {len(query_plans)} hot queries use indexes")
+
+    if AUTO_MIGRATE:
+        with app.app_context():
+            run_migrations(db.engine, service, migrations)
@@ -0,0 +1,29 @@
+import os
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+
+
+def page_args(args):
+    """Read ``limit`` and ``after_id`` from request args; raises ValueError when invalid."""
+    limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    after_id = int(args.get('after_id', 0))
+    if limit < 1 or after_id < 0:
+        raise ValueError("limit must be positive and after_id non-negative")
+    return min(limit, MAX_PAGE_SIZE), after_id
+
+
+def paginate(query, id_column, serialize, args):
+    """Return one keyset page of ``query`` ordered by ``id_column``.
+
+    The envelope carries ``next_after_id``, the cursor for the following page,
+    which is ``None`` once the last page has been returned.
+    """
+    limit, after_id = page_args(args)
+    rows = query.filter(id_column > after_id).order_by(id_column).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [serialize(row) for row in rows],
+        "next_after_id": getattr(rows[-1], id_column.key) if has_more else None
+    }
@@ -0,0 +1,116 @@
+"""Single-flight coalescing of identical concurrent reads within a worker process."""
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from prometheus_client import Counter
+
+SINGLEFLIGHT_ENABLED = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+SINGLEFLIGHT_REUSE_SECONDS = float(os.getenv('SINGLEFLIGHT_REUSE_SECONDS', '0.5'))
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv('SINGLEFLIGHT_WAIT_SECONDS', '5'))
+SINGLEFLIGHT_MAX_ENTRIES = int(os.getenv('SINGLEFLIGHT_MAX_ENTRIES', '1000'))
+
+# role is "leader" for the request that ran the view, "shared" for requests that
+# waited on it and "reused" for requests answered from a just-finished result.
+singleflight_requests_total = Counter(
+    'singleflight_requests_total', 'Requests to single-flight routes', ['endpoint', 'role'])
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires_at = 0.0
+
+
+class SingleFlight:
+    """Runs ``fn`` once per key for all callers that ask while it is in flight.
+
+    A successful result keeps answering the same key for ``reuse_seconds``
+    after it finishes; errors are handed to the waiting callers and then
+    forgotten. A caller that waits longer than ``wait_seconds`` gives up and
+    runs ``fn`` itself.
+    """
+
+    def __init__(self, reuse_seconds=SINGLEFLIGHT_REUSE_SECONDS, wait_seconds=SINGLEFLIGHT_WAIT_SECONDS,
+                 max_entries=SINGLEFLIGHT_MAX_ENTRIES):
+        self.reuse_seconds = reuse_seconds
+        self.wait_seconds = wait_seconds
+        self.max_entries = max_entries
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for key in [key for key, flight in self._flights.items() if flight.done.is_set() and flight.expires_at <= now]:
+            del self._flights[key]
+
+    def do(self, key, fn, reusable=lambda result: True):
+        """Return ``(result, role)``; raises whatever ``fn`` raised for this flight."""
+        with self._lock:
+            now = time.monotonic()
+            flight = self._flights.get(key)
+            if flight is not None and flight.done.is_set() and flight.expires_at <= now:
+                flight = None
+            if flight is None:
+                if len(self._flights) >= self.max_entries:
+                    self._prune(now)
+                leader = self._flights[key] = Flight()
+            else:
+                leader = None
+
+        if leader is None:
+            role = 'reused' if flight.done.is_set() else 'shared'
+            if not flight.done.wait(self.wait_seconds):
+                return fn(), 'timeout'
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, role
+
+        try:
+            leader.result = fn()
+            if reusable(leader.result):
+                leader.expires_at = time.monotonic() + self.reuse_seconds
+            return leader.result, 'leader'
+        except Exception as e:
+            leader.error = e
+            raise
+        finally:
+            leader.done.set()
+            with self._lock:
+                if leader.expires_at <= time.monotonic() and self._flights.get(key) is leader:
+                    del self._flights[key]
+
+
+def single_flight(view=None, reuse_seconds=None):
+    """Let concurrent identical GETs of a view share one execution.
+
+    The key is the endpoint, path and query string plus the table version set
+    by ``conditional_get`` when the view also has one, so a write is never
+    hidden behind an older result. The leader's response is captured as
+    bytes, status and headers, and every waiter gets its own copy so
+    ``after_request`` handlers (compression, metrics) still run per request.
+    Only 200 responses are reused once the flight has landed.
+    """
+    def decorator(view):
+        flights = SingleFlight(SINGLEFLIGHT_REUSE_SECONDS if reuse_seconds is None else reuse_seconds)
+
+        def capture(args, kwargs):
+            response = make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers.items())
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not SINGLEFLIGHT_ENABLED:
+                return view(*args, **kwargs)
+            key = (request.full_path, getattr(g, 'table_version', None))
+            (body, status, headers), role = flights.do(
+                key, lambda: capture(args, kwargs), reusable=lambda result: result[1] == 200)
+            singleflight_requests_total.labels(request.endpoint, role).inc()
+            return Response(body, status=status, headers=headers)
+        wrapper.single_flight = flights
+        return wrapper
+
+    return decorator(view) if view is not None else decorator
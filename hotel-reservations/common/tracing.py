@@ -0,0 +1,105 @@
+import os
+from contextlib import contextmanager
+from functools import wraps
+
+import opentracing
+from jaeger_client import Config
+from jaeger_client.sampler import AdaptiveSampler
+from opentracing.ext import tags
+from opentracing.propagation import Format
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+TRACE_SAMPLER_TYPE = os.getenv('TRACE_SAMPLER_TYPE', 'probabilistic')
+TRACE_SAMPLER_PARAM = float(os.getenv('TRACE_SAMPLER_PARAM', '0.1'))
+TRACE_SAMPLER_LOWER_BOUND = float(os.getenv('TRACE_SAMPLER_LOWER_BOUND', '0.1'))
+TRACE_SAMPLER_MAX_OPERATIONS = int(os.getenv('TRACE_SAMPLER_MAX_OPERATIONS', '200'))
+TRACE_REPORTER_QUEUE_SIZE = int(os.getenv('TRACE_REPORTER_QUEUE_SIZE', '1000'))
+TRACE_REPORTER_BATCH_SIZE = int(os.getenv('TRACE_REPORTER_BATCH_SIZE', '20'))
+TRACE_REPORTER_FLUSH_INTERVAL = float(os.getenv('TRACE_REPORTER_FLUSH_INTERVAL', '1.0'))
+TRACE_LOG_SPANS = os.getenv('TRACE_LOG_SPANS', 'false').lower() == 'true'
+JAEGER_AGENT_HOST = os.getenv('JAEGER_AGENT_HOST', 'jaeger')
+JAEGER_AGENT_PORT = int(os.getenv('JAEGER_AGENT_PORT', '6831'))
+
+
+def sampler_config():
+    """Sampler settings for ``jaeger_client.Config`` from the ``TRACE_SAMPLER_*`` variables.
+
+    ``probabilistic`` samples ``TRACE_SAMPLER_PARAM`` of the traces,
+    ``ratelimiting`` at most ``TRACE_SAMPLER_PARAM`` traces per second,
+    ``adaptive`` samples each operation probabilistically but at least
+    ``TRACE_SAMPLER_LOWER_BOUND`` times per second so rare endpoints still show
+    up, ``remote`` polls the strategy from the Jaeger agent and ``const`` traces
+    everything (1) or nothing (0).
+    """
+    if TRACE_SAMPLER_TYPE == 'adaptive':
+        return AdaptiveSampler({
+            'defaultSamplingProbability': TRACE_SAMPLER_PARAM,
+            'defaultLowerBoundTracesPerSecond': TRACE_SAMPLER_LOWER_BOUND,
+            'perOperationStrategies': [],
+        }, TRACE_SAMPLER_MAX_OPERATIONS)
+    if TRACE_SAMPLER_TYPE == 'remote':
+        return {}
+    return {'type': TRACE_SAMPLER_TYPE, 'param': TRACE_SAMPLER_PARAM}
+
+
+def initialize_tracer(service_name):
+    """Create the service's tracer and make it the global one used for outbound propagation.
+
+    Spans are queued in memory and sent to the agent in batches from a
+    background thread, so finishing a span never waits on the network; when
+    the queue is full new spans are dropped rather than blocking requests.
+    Call it again in every forked worker, since the reporter thread does not
+    survive a fork.
+    """
+    if not TRACING_ENABLED:
+        tracer = opentracing.Tracer()
+    else:
+        config = Config(
+            config={
+                'sampler': sampler_config(),
+                'logging': TRACE_LOG_SPANS,
+                'local_agent': {'reporting_host': JAEGER_AGENT_HOST, 'reporting_port': JAEGER_AGENT_PORT},
+                'reporter_queue_size': TRACE_REPORTER_QUEUE_SIZE,
+                'reporter_batch_size': TRACE_REPORTER_BATCH_SIZE,
+                'reporter_flush_interval': TRACE_REPORTER_FLUSH_INTERVAL,
+            },
+            service_name=service_name,
+        )
+        tracer = config.new_tracer()
+    opentracing.set_global_tracer(tracer)
+    return tracer
+
+
+@contextmanager
+def client_span(operation, method, url, headers):
+    """Trace an outbound HTTP call and inject its context into ``headers``.
+
+    Calls made outside a traced request are not traced, so background work
+    does not start a new trace for every request it sends.
+    """
+    tracer = opentracing.global_tracer()
+    parent = tracer.active_span
+    if parent is None:
+        yield None
+        return
+    with tracer.start_span(operation, child_of=parent, tags={
+        tags.SPAN_KIND: tags.SPAN_KIND_RPC_CLIENT,
+        tags.HTTP_METHOD: method,
+        tags.HTTP_URL: url,
+    }) as span:
+        tracer.inject(span.context, Format.HTTP_HEADERS, headers)
+        yield span
+
+
+def with_active_span(fn):
+    """Wrap ``fn`` so it runs under the caller's active span when executed on another thread."""
+    tracer = opentracing.global_tracer()
+    span = tracer.active_span
+    if span is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        with tracer.scope_manager.activate(span, finish_on_close=False):
+            return fn(*args, **kwargs)
+    return run
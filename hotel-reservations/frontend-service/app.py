@@ -1,24 +1,33 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response
-import requests
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, g
 import os
+import threading
+import time
 import jwt
 import re
 from functools import wraps
-from prometheus_client import Counter, generate_latest
-from datetime import datetime
+from flask_opentracing import FlaskTracing
+from datetime import datetime, timedelta, timezone
+from common.fanout import fan_out
+from common.http_client import ServiceClient
+from common.launcher import after_fork
+from common.logging_setup import init_logging
+from common.metrics import init_metrics
+from common.tracing import initialize_tracer
+
+logger = init_logging("frontend-service")
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'MySecretKey1@'
 
-http_requests_total = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint'])
+init_metrics(app)
 
-@app.before_request
-def before_request():
-    http_requests_total.labels(request.method, request.endpoint).inc()
+tracer = initialize_tracer("frontend-service")
+flask_tracer = FlaskTracing(lambda: tracer, True, app)
 
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return Response(generate_latest(), mimetype='text/plain')
+@after_fork
+def reset_tracer():
+    global tracer
+    tracer = initialize_tracer("frontend-service")
 
 HOTEL_BACKEND_URL = os.getenv('HOTEL_BACKEND_URL', 'http://hotel-service:5001')
 ROOM_BACKEND_URL = os.getenv('ROOM_BACKEND_URL', 'http://room-service:5002')
@@ -26,6 +35,29 @@ RESERVATION_BACKEND_URL = os.getenv('RESERVATION_BACKEND_URL', 'http://reservati
 USER_BACKEND_URL = os.getenv('USER_BACKEND_URL', 'http://user-service:5000')
 PAYMENT_BACKEND_URL = os.getenv('PAYMENT_BACKEND_URL', 'http://payment-service:5004')
 
+# Catalog reads are revalidated with the services' ETags instead of being fetched again.
+BACKEND_VALIDATOR_CACHE_SIZE = int(os.getenv('BACKEND_VALIDATOR_CACHE_SIZE', '1000'))
+hotel_backend = ServiceClient('hotel-service', HOTEL_BACKEND_URL, validator_cache=BACKEND_VALIDATOR_CACHE_SIZE)
+room_backend = ServiceClient('room-service', ROOM_BACKEND_URL, validator_cache=BACKEND_VALIDATOR_CACHE_SIZE)
+reservation_backend = ServiceClient('reservation-service', RESERVATION_BACKEND_URL)
+user_backend = ServiceClient('user-service', USER_BACKEND_URL)
+
+ROOMS_BATCH_SIZE = int(os.getenv('ROOMS_BATCH_SIZE', '50'))
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '20'))
+TOKEN_TTL_SECONDS = int(os.getenv('TOKEN_TTL_SECONDS', '86400'))
+USER_ID_CACHE_SECONDS = float(os.getenv('USER_ID_CACHE_SECONDS', '300'))
+USER_ID_CACHE_SIZE = int(os.getenv('USER_ID_CACHE_SIZE', '1024'))
+
+_user_ids = {}
+_user_ids_lock = threading.Lock()
+
+def page_params():
+    params = {'limit': PAGE_SIZE}
+    for name in ('after_id', 'location', 'hotel_id', 'type'):
+        if request.args.get(name):
+            params[name] = request.args[name]
+    return params
+
 def validate_password(password):
     if len(password) < 8:
         return "Password must be at least 8 characters long."
@@ -37,6 +69,39 @@ def validate_password(password):
         return "Password must contain at least one digit."
     return None
 
+def issue_token(email, user_id):
+    claims = {
+        'email': email,
+        'user_id': user_id,
+        'exp': datetime.now(timezone.utc) + timedelta(seconds=TOKEN_TTL_SECONDS)
+    }
+    return jwt.encode(claims, app.config['SECRET_KEY'], algorithm='HS256')
+
+def lookup_user_id(email):
+    # Tokens issued before user_id was added to the claims only carry the email,
+    # so resolve it through user-service and remember the answer for a while.
+    now = time.monotonic()
+    with _user_ids_lock:
+        cached = _user_ids.get(email)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    user_response = user_backend.get(f'/users/email/{email}')
+    if user_response.status_code != 200:
+        return None
+    user_id = user_response.json().get('id')
+
+    with _user_ids_lock:
+        if len(_user_ids) >= USER_ID_CACHE_SIZE:
+            _user_ids.pop(next(iter(_user_ids)))
+        _user_ids[email] = (user_id, now + USER_ID_CACHE_SECONDS)
+    return user_id
+
+def current_user_id():
+    if g.user_id is None:
+        g.user_id = lookup_user_id(g.email)
+    return g.user_id
+
 def require_token(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -44,11 +109,13 @@ def require_token(f):
         if not token:
             return redirect(url_for('login'))
         try:
-            jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            claims = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
             return redirect(url_for('login'))
         except jwt.InvalidTokenError:
             return redirect(url_for('login'))
+        g.email = claims.get('email')
+        g.user_id = claims.get('user_id')
         return f(*args, **kwargs)
     return decorated_function
 
@@ -60,31 +127,38 @@ def index():
 @app.route('/hotels')
 @require_token
 def hotels():
-    token = request.cookies.get('token')
-    if not token:
-        return redirect(url_for('login'))    # Redirect to login if no token is found
-    decoded = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-    email = decoded.get('email')
-    
+    location = request.args.get('location', '')
     try:
-        response = requests.get(f'{HOTEL_BACKEND_URL}/hotels')
-        hotels = response.json()
+        response = hotel_backend.get('/hotels', params=page_params())
+        response.raise_for_status()
+        page = response.json()
+        hotels, next_after_id = page['items'], page['next_after_id']
     except Exception as e:
-        hotels = []
+        hotels, next_after_id = [], None
         print(f"Error fetching hotels: {e}")
 
+    def fetch_rooms(hotel_ids):
+        room_response = room_backend.get('/rooms/hotels', params={'ids': ','.join(hotel_ids)})
+        room_response.raise_for_status()
+        return room_response.json()
+
+    hotel_ids = [str(hotel['id']) for hotel in hotels]
+    batches = {
+        offset: (lambda batch=hotel_ids[offset:offset + ROOMS_BATCH_SIZE]: fetch_rooms(batch))
+        for offset in range(0, len(hotel_ids), ROOMS_BATCH_SIZE)
+    }
+    rooms_by_hotel = {}
+    for offset, result in fan_out(batches).items():
+        if result.ok:
+            rooms_by_hotel.update(result.value)
+        else:
+            logger.warning("Error fetching rooms for hotels %s: %s", hotel_ids[offset:offset + ROOMS_BATCH_SIZE], result.error)
+
     for hotel in hotels:
-        try:
-            room_response = requests.get(f'{ROOM_BACKEND_URL}/rooms/hotel/{hotel["id"]}')
-            if room_response.status_code == 200:
-                hotel['rooms'] = room_response.json()
-            else:
-                hotel['rooms'] = []
-        except Exception as e:
-            hotel['rooms'] = []
-            print(f"Error fetching rooms for hotel {hotel['id']}: {e}")
+        hotel['rooms'] = rooms_by_hotel.get(str(hotel['id']), [])
 
-    return render_template('hotels.html', hotels=hotels, email=email)
+    return render_template('hotels.html', hotels=hotels, email=g.email,
+                           location=location, next_after_id=next_after_id)
 
 @app.route('/hotels/add', methods=['GET', 'POST'])
 @require_token
@@ -95,8 +169,8 @@ def add_hotel():
         facilities = request.form.getlist('facilities')
 
         try:
-            response = requests.post(
-                f'{HOTEL_BACKEND_URL}/hotels',
+            response = hotel_backend.post(
+                '/hotels',
                 json={
                     'name': name,
                     'location': location,
@@ -123,8 +197,8 @@ def add_room():
         availability = True
 
         try:
-            response = requests.post(
-                f'{ROOM_BACKEND_URL}/rooms',
+            response = room_backend.post(
+                '/rooms',
                 json={
                     'hotel_id': hotel_id,
                     'type': type,
@@ -145,29 +219,68 @@ def add_room():
 @require_token
 def rooms():
     try:
-        response = requests.get(f'{ROOM_BACKEND_URL}/rooms')
-        rooms = response.json()
+        response = room_backend.get('/rooms', params=page_params())
+        response.raise_for_status()
+        page = response.json()
+        rooms, next_after_id = page['items'], page['next_after_id']
     except Exception as e:
-        rooms = []
+        rooms, next_after_id = [], None
         print(f"Error fetching rooms: {e}")
 
-    return render_template('rooms.html', rooms=rooms)
+    return render_template('rooms.html', rooms=rooms, next_after_id=next_after_id,
+                           hotel_id=request.args.get('hotel_id', ''), type=request.args.get('type', ''))
+
+
+@app.route('/search')
+@require_token
+def search():
+    filters = {name: request.args.get(name, '') for name in ('location', 'check_in', 'check_out', 'type', 'max_price')}
+    if not (filters['location'] and filters['check_in'] and filters['check_out']):
+        return render_template('search.html', rooms=[], searched=False, next_after_id=None, **filters)
+
+    try:
+        params = {
+            'location': filters['location'],
+            'check_in': datetime.strptime(filters['check_in'], '%Y-%m-%d').strftime('%d-%m-%Y'),
+            'check_out': datetime.strptime(filters['check_out'], '%Y-%m-%d').strftime('%d-%m-%Y'),
+            'limit': PAGE_SIZE
+        }
+    except ValueError:
+        return render_template('search.html', rooms=[], searched=True, next_after_id=None,
+                               error="Invalid dates.", **filters)
+    for name in ('type', 'max_price', 'after_id'):
+        if request.args.get(name):
+            params[name] = request.args[name]
+
+    try:
+        response = room_backend.get('/rooms/search', params=params)
+        if response.status_code != 200:
+            return render_template('search.html', rooms=[], searched=True, next_after_id=None,
+                                   error=response.json().get('error', 'Search failed.'), **filters)
+        page = response.json()
+        rooms, next_after_id = page['items'], page['next_after_id']
+
+        hotel_ids = ','.join(sorted({str(room['hotel_id']) for room in rooms}))
+        hotels = {}
+        if hotel_ids:
+            hotel_response = hotel_backend.get('/hotels/batch', params={'ids': hotel_ids})
+            if hotel_response.status_code == 200:
+                hotels = {hotel['id']: hotel for hotel in hotel_response.json()}
+        for room in rooms:
+            room['hotel'] = hotels.get(room['hotel_id'], {})
+    except Exception as e:
+        return render_template('search.html', rooms=[], searched=True, next_after_id=None,
+                               error=f"Error: {str(e)}", **filters)
 
+    return render_template('search.html', rooms=rooms, searched=True, next_after_id=next_after_id, **filters)
 
 @app.route('/rooms/reserve', methods=['POST'])
 @require_token
 def reserve_room():
-    token = request.cookies.get('token')
-    if not token:
-        return redirect(url_for('login'))
-    decoded = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-    email = decoded.get('email')
-
     try:
-        user_response = requests.get(f'{USER_BACKEND_URL}/users/email/{email}')
-        if user_response.status_code != 200:
+        user_id = current_user_id()
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
-        user_id = user_response.json().get('id')
     except Exception as e:
         return jsonify({"error": f"Error fetching user data: {str(e)}"}), 500
 
@@ -192,8 +305,8 @@ def reserve_room():
     check_out = check_out_date.strftime('%d-%m-%Y')
 
     try:
-        reservation_response = requests.post(
-            f'{RESERVATION_BACKEND_URL}/reservations',
+        reservation_response = reservation_backend.post(
+            '/reservations',
             json={
                 'user_id': user_id,
                 'room_id': room_id,
@@ -204,13 +317,6 @@ def reserve_room():
         if reservation_response.status_code != 201:
             return jsonify({"error": "Failed to create reservation"}), reservation_response.status_code
 
-        room_response = requests.put(
-            f'{ROOM_BACKEND_URL}/rooms/{room_id}',
-            json={'availability': False}
-        )
-        if room_response.status_code != 200:
-            return jsonify({"error": "Failed to update room availability"}), room_response.status_code
-
         return redirect('/hotels')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -219,53 +325,19 @@ def reserve_room():
 @app.route('/reservations')
 @require_token
 def reservations():
-    token = request.cookies.get('token')
-    if not token:
-        return redirect(url_for('login'))
-    decoded = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-    email = decoded.get('email')
-
     try:
-        user_response = requests.get(f'{USER_BACKEND_URL}/users/email/{email}')
-        if user_response.status_code != 200:
+        user_id = current_user_id()
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
-        user_id = user_response.json().get('id')
     except Exception as e:
         return jsonify({"error": f"Error fetching user data: {str(e)}"}), 500
 
     try:
-        reservations_response = requests.get(f'{RESERVATION_BACKEND_URL}/reservations/user/{user_id}')
+        reservations_response = reservation_backend.get(f'/reservations/user/{user_id}/details')
         if reservations_response.status_code != 200:
             return jsonify({"error": "Failed to fetch reservations"}), reservations_response.status_code
 
-        reservations = reservations_response.json()
-
-        detailed_reservations = []
-        for reservation in reservations:
-            reservation_id = reservation['id']
-            try:
-                details_response = requests.get(f'{RESERVATION_BACKEND_URL}/reservations/details/{reservation_id}')
-                if details_response.status_code == 200:
-                    details = details_response.json()
-
-                    try:
-                        payment_response = requests.get(f'{PAYMENT_BACKEND_URL}/payments/reservation/{reservation_id}')
-                        if payment_response.status_code == 200:
-                            payment_data = payment_response.json()
-                            details['payment'] = payment_data['amount']
-                            details['status'] = payment_data['status']
-                        else:
-                            details['payment'] = "N/A"
-                            details['status'] = "Not Paid"
-                    except Exception as e:
-                        details['payment'] = "Error"
-                        details['status'] = "Error fetching payment"
-
-                    detailed_reservations.append(details)
-            except Exception as e:
-                print(f"Error fetching details for reservation {reservation_id}: {e}")
-
-        return render_template('reservations.html', reservations=detailed_reservations)
+        return render_template('reservations.html', reservations=reservations_response.json())
     except Exception as e:
         return jsonify({"error": f"Error fetching reservations: {str(e)}"}), 500
 
@@ -276,17 +348,18 @@ def login():
         password = request.form.get('password')
 
         try:
-            response = requests.post(
-                f'{USER_BACKEND_URL}/login',
+            response = user_backend.post(
+                '/login',
                 json={'email': email, 'password': password}
             )
 
             if response.status_code == 200:
                 user_data = response.json()
-                token = jwt.encode({'email': email}, app.config['SECRET_KEY'], algorithm='HS256')
+                user_id = user_data.get('id') or lookup_user_id(email)
+                token = issue_token(email, user_id)
 
                 resp = redirect(url_for('index'))
-                resp.set_cookie('token', token)
+                resp.set_cookie('token', token, max_age=TOKEN_TTL_SECONDS)
                 return resp
             else:
                 return render_template('login.html', error="Invalid email or password")
@@ -304,7 +377,7 @@ def register():
         password = request.form.get('password')
 
         try:
-            response = requests.get(f'{USER_BACKEND_URL}/users/email/{email}')
+            response = user_backend.get(f'/users/email/{email}')
             if response.status_code == 200:
                 return render_template('register.html', error="Error: Email already exists.")
         except Exception as e:
@@ -316,8 +389,8 @@ def register():
             return render_template('register.html', error=password_error)
         
         try:
-            response = requests.post(
-                f'{USER_BACKEND_URL}/users',
+            response = user_backend.post(
+                '/users',
                 json={'name': name, 'email': email, 'password': password}
             )
 
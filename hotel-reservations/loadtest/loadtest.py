@@ -0,0 +1,399 @@
+"""Drive the main user journeys through the frontend with open-loop arrivals.
+
+Journeys start on a Poisson schedule at ``--rate`` per second no matter how
+fast earlier ones finish. At most ``--concurrency`` run at once; arrivals
+beyond that are counted as dropped instead of being delayed, so an
+overloaded stack shows up as drops and latency rather than as a lower
+offered load. Results go to a JSON file with stable key order, so two runs
+can be diffed or compared with ``--compare``.
+
+    python loadtest.py --url http://localhost:8085 --seed-hotels 200 --api-url http://localhost:8081 \\
+        --rate 20 --duration 60 --output results.json
+    python loadtest.py --standin --rate 50 --duration 10
+    python loadtest.py --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import aiohttp
+
+DEFAULT_MIX = 'browse=55,book=25,history=10,signup=10'
+DEFAULT_LOCATIONS = 'Bucharest,Cluj-Napoca,Brasov,Constanta,Iasi,Sibiu'
+ROOM_TYPES = ('single', 'double', 'twin', 'suite', 'family')
+PASSWORD = 'LoadTest1'
+
+ROOM_ID = re.compile(r'name="room_id" value="(\d+)"')
+NEXT_PAGE = re.compile(r'href="/hotels\?after_id=(\d+)')
+
+# The frontend answers form posts with a redirect on success and re-renders the
+# form (200) on failure. A 409 on reserve is a lost race for the room, which a
+# realistic mix produces; it is reported in the statuses but is not an error.
+EXPECTED = {
+    'register': {302},
+    'login': {302},
+    'browse_hotels': {200},
+    'browse_next_page': {200},
+    'reserve': {302, 409},
+    'view_reservations': {200},
+}
+
+
+class StepFailed(Exception):
+    pass
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def parse_weights(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {'browse', 'book', 'history', 'signup'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown journeys: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.journeys = defaultdict(Counter)
+        self.start_lag = []
+
+    def record(self, step, status, elapsed):
+        self.latencies[step].append(elapsed)
+        self.statuses[step][str(status)] += 1
+        if status not in EXPECTED[step]:
+            self.errors[step] += 1
+
+    def to_dict(self, elapsed):
+        def latency(samples):
+            millis = [sample * 1000 for sample in samples]
+            return {
+                'mean': round(sum(millis) / len(millis), 2),
+                'p50': round(percentile(millis, 0.5), 2),
+                'p95': round(percentile(millis, 0.95), 2),
+                'p99': round(percentile(millis, 0.99), 2),
+                'max': round(max(millis), 2),
+            }
+
+        steps = {}
+        for step, samples in self.latencies.items():
+            steps[step] = {
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'errors': self.errors[step],
+                'error_rate': round(self.errors[step] / len(samples), 4),
+                'statuses': dict(self.statuses[step]),
+                'latency_ms': latency(samples),
+            }
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'journeys': {name: dict(counts) for name, counts in self.journeys.items()},
+            'start_lag_ms': latency(self.start_lag) if self.start_lag else None,
+            'steps': steps,
+        }
+
+
+class LoadTest:
+    def __init__(self, args, url):
+        self.args = args
+        self.url = url.rstrip('/')
+        self.rng = random.Random(args.seed)
+        self.stats = Stats()
+        self.run_id = uuid.uuid4().hex[:8]
+        self.locations = [location for location in args.locations.split(',') if location]
+        self.users = []
+        self.signups = 0
+
+    def session(self):
+        # Every journey is a separate browser: its own cookies, the shared connection pool.
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                     cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                     timeout=aiohttp.ClientTimeout(total=self.args.timeout))
+
+    async def step(self, session, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            async with session.request(method, self.url + path, allow_redirects=False, **kwargs) as response:
+                body = await response.text()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            body, status = '', type(e).__name__
+        self.stats.record(name, status, time.perf_counter() - started)
+        if status not in EXPECTED[name]:
+            raise StepFailed(name)
+        return status, body
+
+    async def think(self):
+        if self.args.think > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.think))
+
+    def new_user(self):
+        self.signups += 1
+        return {
+            'name': f'Load Tester {self.signups}',
+            'email': f'load-{self.run_id}-{self.signups}@example.com',
+            'password': PASSWORD,
+        }
+
+    async def register(self, session, user):
+        await self.step(session, 'register', 'POST', '/register', data=user)
+        self.users.append(user)
+
+    async def login(self, session, user):
+        await self.step(session, 'login', 'POST', '/login', data={'email': user['email'], 'password': user['password']})
+
+    async def browse(self, session):
+        # Most visitors open the unfiltered list; some filter by a popular city, and a few page on.
+        params = {}
+        if self.locations and self.rng.random() < self.args.filter_ratio:
+            params['location'] = self.rng.choices(self.locations, [1 / (i + 1) for i in range(len(self.locations))])[0]
+        _, body = await self.step(session, 'browse_hotels', 'GET', '/hotels', params=params)
+        rooms = [int(room_id) for room_id in ROOM_ID.findall(body)]
+        next_page = NEXT_PAGE.search(body)
+        if next_page and self.rng.random() < self.args.next_page_ratio:
+            await self.think()
+            params['after_id'] = next_page.group(1)
+            _, body = await self.step(session, 'browse_next_page', 'GET', '/hotels', params=params)
+            rooms = [int(room_id) for room_id in ROOM_ID.findall(body)] or rooms
+        return rooms
+
+    def stay(self):
+        # Bookings cluster in the coming weeks and are mostly short.
+        check_in = date.today() + timedelta(days=1 + min(int(self.rng.expovariate(1 / 14)), 180))
+        nights = self.rng.choices(range(1, 8), [30, 25, 15, 10, 8, 6, 6])[0]
+        return check_in.isoformat(), (check_in + timedelta(days=nights)).isoformat()
+
+    async def reserve(self, session, rooms):
+        # Rooms near the top of the page are picked far more often, as they are in practice.
+        room_id = self.rng.choices(rooms, [1 / (i + 1) for i in range(len(rooms))])[0]
+        check_in, check_out = self.stay()
+        await self.step(session, 'reserve', 'POST', '/rooms/reserve',
+                        data={'room_id': room_id, 'check_in': check_in, 'check_out': check_out})
+
+    async def journey(self, name):
+        async with self.session() as session:
+            if name == 'signup' or not self.users:
+                user = self.new_user()
+                await self.register(session, user)
+                await self.think()
+                await self.login(session, user)
+                await self.think()
+                await self.browse(session)
+                return 'completed'
+
+            await self.login(session, self.rng.choice(self.users))
+            await self.think()
+            if name == 'history':
+                await self.step(session, 'view_reservations', 'GET', '/reservations')
+                return 'completed'
+
+            rooms = await self.browse(session)
+            if name == 'browse':
+                return 'completed'
+            if not rooms:
+                return 'no_rooms'
+            await self.think()
+            await self.reserve(session, rooms)
+            await self.think()
+            await self.step(session, 'view_reservations', 'GET', '/reservations')
+            return 'completed'
+
+    async def run_journey(self, name, lag):
+        self.stats.start_lag.append(lag)
+        counts = self.stats.journeys[name]
+        counts['started'] += 1
+        try:
+            counts[await self.journey(name)] += 1
+        except StepFailed as e:
+            counts[f'failed_at_{e.args[0]}'] += 1
+        except Exception as e:
+            counts[f'crashed_{type(e).__name__}'] += 1
+
+    async def setup_users(self):
+        pending = [self.new_user() for _ in range(self.args.users)]
+        # Registration hashes a password per account, so setup stays well inside user-service's queue.
+        semaphore = asyncio.Semaphore(self.args.setup_concurrency)
+
+        async def register(user):
+            async with semaphore, self.session() as session:
+                try:
+                    await self.register(session, user)
+                except StepFailed:
+                    pass
+
+        await asyncio.gather(*(register(user) for user in pending))
+        print(f"Registered {len(self.users)}/{len(pending)} users", file=sys.stderr)
+        # Setup is not part of the measured run.
+        self.stats = Stats()
+
+    async def run(self):
+        self.connector = aiohttp.TCPConnector(limit=self.args.concurrency)
+        try:
+            await self.setup_users()
+            names, weights = zip(*self.args.mix.items())
+            tasks = set()
+            started = time.perf_counter()
+            deadline = started + self.args.duration
+            arrival = started
+            while True:
+                arrival += self.rng.expovariate(self.args.rate)
+                if arrival >= deadline:
+                    break
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+                name = self.rng.choices(names, weights)[0]
+                self.stats.journeys[name]['arrived'] += 1
+                if len(tasks) >= self.args.concurrency:
+                    self.stats.journeys[name]['dropped'] += 1
+                    continue
+                task = asyncio.ensure_future(self.run_journey(name, time.perf_counter() - arrival))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+            return self.stats.to_dict(time.perf_counter() - started)
+        finally:
+            await self.connector.close()
+
+
+async def seed_catalog(api_url, hotels, locations, rooms_per_hotel, rng):
+    """Bulk-import ``hotels`` hotels with rooms through the services' bulk endpoints.
+
+    Hotels are spread over ``locations`` with a few cities holding most of
+    them; each gets 1 to ``2 * rooms_per_hotel - 1`` rooms of mixed types and prices.
+    """
+    weights = [1 / (i + 1) for i in range(len(locations))]
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+        async def hotel_ids():
+            ids = set()
+            for location in locations:
+                async with session.get(f'{api_url}/hotels/ids', params={'location': location}) as response:
+                    response.raise_for_status()
+                    ids.update(await response.json())
+            return ids
+
+        before = await hotel_ids()
+        hotel_rows = ''.join(json.dumps({
+            'name': f'Hotel {location} {i}',
+            'location': location,
+            'facilities': rng.sample(['wifi', 'parking', 'pool', 'spa', 'gym', 'restaurant'], rng.randint(0, 4)),
+        }) + '\n' for i, location in enumerate(rng.choices(locations, weights, k=hotels)))
+        async with session.post(f'{api_url}/hotels/bulk', data=hotel_rows,
+                                headers={'Content-Type': 'application/x-ndjson'}) as response:
+            report = await response.json()
+        print(f"Seeded hotels: {report['inserted']} inserted, {report['failed']} failed", file=sys.stderr)
+
+        room_rows = []
+        for hotel_id in sorted(await hotel_ids() - before):
+            for _ in range(rng.randint(1, 2 * rooms_per_hotel - 1)):
+                room_type = rng.choice(ROOM_TYPES)
+                price = round(rng.lognormvariate(5, 0.4) * (2 if room_type == 'suite' else 1), 2)
+                room_rows.append(json.dumps({'hotel_id': hotel_id, 'type': room_type, 'price': price}) + '\n')
+        async with session.post(f'{api_url}/rooms/bulk', data=''.join(room_rows),
+                                headers={'Content-Type': 'application/x-ndjson'}) as response:
+            report = await response.json()
+        print(f"Seeded rooms: {report['inserted']} inserted, {report['failed']} failed", file=sys.stderr)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)['results']['steps']
+    with open(after_path) as f:
+        after = json.load(f)['results']['steps']
+    print(f"{'step':>18} {'rps':>17} {'p50 ms':>19} {'p99 ms':>19} {'error rate':>19}")
+    for step in sorted(set(before) | set(after)):
+        old, new = before.get(step), after.get(step)
+        if old is None or new is None:
+            print(f"{step:>18}  only in {'after' if old is None else 'before'}")
+            continue
+        columns = [
+            (old['throughput_rps'], new['throughput_rps']),
+            (old['latency_ms']['p50'], new['latency_ms']['p50']),
+            (old['latency_ms']['p99'], new['latency_ms']['p99']),
+            (old['error_rate'], new['error_rate']),
+        ]
+        print(f"{step:>18} " + ' '.join(f"{a:>8} -> {b:<8}" for a, b in columns))
+
+
+async def main_async(args):
+    runner = None
+    url = args.url
+    if args.standin:
+        import standin
+        runner, url = await standin.start(hotel_count=args.seed_hotels or 200, locations=args.locations.split(','),
+                                          latency=args.standin_latency, seed=args.seed)
+    elif args.seed_hotels:
+        await seed_catalog(args.api_url.rstrip('/'), args.seed_hotels, args.locations.split(','),
+                           args.rooms_per_hotel, random.Random(args.seed))
+    try:
+        results = await LoadTest(args, url).run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return url, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8085', help='frontend base URL')
+    parser.add_argument('--standin', action='store_true', help='run against an in-process stand-in of the frontend')
+    parser.add_argument('--standin-latency', type=float, default=0.005, help='mean stand-in response time in seconds')
+    parser.add_argument('--rate', type=float, default=10.0, help='journey arrivals per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to keep starting journeys')
+    parser.add_argument('--concurrency', type=int, default=100, help='journeys in flight before arrivals are dropped')
+    parser.add_argument('--mix', type=parse_weights, default=parse_weights(DEFAULT_MIX),
+                        help='journey weights: browse, book, history and signup')
+    parser.add_argument('--users', type=int, default=50, help='accounts registered before the run')
+    parser.add_argument('--setup-concurrency', type=int, default=4, help='registrations in flight during setup')
+    parser.add_argument('--think', type=float, default=0.2, help='mean pause between steps in seconds')
+    parser.add_argument('--filter-ratio', type=float, default=0.3, help='share of browses filtered by location')
+    parser.add_argument('--next-page-ratio', type=float, default=0.25, help='share of browses that open a second page')
+    parser.add_argument('--locations', default=DEFAULT_LOCATIONS, help='comma-separated cities, most popular first')
+    parser.add_argument('--seed-hotels', type=int, default=0, help='hotels to bulk-import before the run')
+    parser.add_argument('--rooms-per-hotel', type=int, default=4, help='average rooms per seeded hotel')
+    parser.add_argument('--api-url', default='http://localhost:8081', help='gateway used for seeding the catalog')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for a repeatable mix')
+    parser.add_argument('--output', default='loadtest-results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    url, results = asyncio.run(main_async(args))
+    config = {name: getattr(args, name) for name in (
+        'rate', 'duration', 'concurrency', 'mix', 'users', 'think', 'filter_ratio', 'next_page_ratio', 'seed')}
+    config['target'] = 'standin' if args.standin else url
+    with open(args.output, 'w') as f:
+        json.dump({'config': config, 'results': results}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    for step, stats in sorted(results['steps'].items()):
+        latency = stats['latency_ms']
+        print(f"{step:>18}: {stats['requests']:6d} req  {stats['throughput_rps']:7.1f} req/s  "
+              f"p50 {latency['p50']:7.1f} ms  p95 {latency['p95']:7.1f} ms  p99 {latency['p99']:7.1f} ms  "
+              f"errors {stats['error_rate']:.2%}")
+    for name, counts in sorted(results['journeys'].items()):
+        print(f"{name:>18}: {dict(sorted(counts.items()))}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""In-process stand-in for the frontend, for running the load test without the compose stack.
+
+It serves the routes the journeys use with the same forms, redirects, cookie
+and status codes as frontend-service, keeps users, hotels and reservations
+in memory and adds a random delay to every response. Useful for checking
+the load generator itself and for runs on a laptop.
+"""
+import asyncio
+import html
+import random
+import secrets
+from datetime import datetime
+
+from aiohttp import web
+
+PAGE_SIZE = 20
+ROOM_TYPES = ('single', 'double', 'twin', 'suite', 'family')
+
+
+class Store:
+    def __init__(self, hotels, locations, rng):
+        self.users = {}
+        self.tokens = {}
+        self.hotels = []
+        self.stays = {}
+        self.reservations = {}
+        room_id = 0
+        for hotel_id in range(1, hotels + 1):
+            rooms = []
+            for _ in range(rng.randint(1, 7)):
+                room_id += 1
+                rooms.append({'id': room_id, 'type': rng.choice(ROOM_TYPES), 'price': round(rng.uniform(40, 400), 2)})
+            location = rng.choices(locations, [1 / (i + 1) for i in range(len(locations))])[0]
+            self.hotels.append({'id': hotel_id, 'name': f'Hotel {location} {hotel_id}', 'location': location,
+                                'rooms': rooms})
+
+
+def user_email(request, store):
+    return store.tokens.get(request.cookies.get('token'))
+
+
+def login_required(handler):
+    async def wrapper(request):
+        email = user_email(request, request.app['store'])
+        if email is None:
+            raise web.HTTPFound('/login')
+        return await handler(request, email)
+    return wrapper
+
+
+async def register(request):
+    store = request.app['store']
+    form = await request.post()
+    if form['email'] in store.users:
+        return web.Response(text='Error: Email already exists.', content_type='text/html')
+    store.users[form['email']] = {'id': len(store.users) + 1, 'password': form['password']}
+    raise web.HTTPFound('/login')
+
+
+async def login(request):
+    store = request.app['store']
+    form = await request.post()
+    user = store.users.get(form['email'])
+    if user is None or user['password'] != form['password']:
+        return web.Response(text='Invalid email or password', content_type='text/html')
+    token = secrets.token_hex(16)
+    store.tokens[token] = form['email']
+    response = web.HTTPFound('/')
+    response.set_cookie('token', token)
+    raise response
+
+
+@login_required
+async def hotels(request, email):
+    store = request.app['store']
+    location = request.query.get('location')
+    after_id = int(request.query.get('after_id', 0))
+    matching = [hotel for hotel in store.hotels if hotel['id'] > after_id and (not location or hotel['location'] == location)]
+    page = matching[:PAGE_SIZE]
+    parts = []
+    for hotel in page:
+        parts.append(f"<li><strong>{html.escape(hotel['name'])}</strong> - {html.escape(hotel['location'])}<ul>")
+        for room in hotel['rooms']:
+            parts.append(f'<li>{room["type"]} {room["price"]}<form action="/rooms/reserve" method="post">'
+                         f'<input type="hidden" name="room_id" value="{room["id"]}"></form></li>')
+        parts.append('</ul></li>')
+    if len(matching) > PAGE_SIZE:
+        parts.append(f'<a href="/hotels?after_id={page[-1]["id"]}">Next</a>')
+    return web.Response(text=''.join(parts), content_type='text/html')
+
+
+@login_required
+async def reserve(request, email):
+    store = request.app['store']
+    form = await request.post()
+    check_in = datetime.strptime(form['check_in'], '%Y-%m-%d').date()
+    check_out = datetime.strptime(form['check_out'], '%Y-%m-%d').date()
+    if check_out <= check_in:
+        return web.json_response({'error': 'Check-out date is earlier than or equal to check-in date.'}, status=500)
+    stays = store.stays.setdefault(int(form['room_id']), [])
+    if any(start < check_out and check_in < end for start, end in stays):
+        return web.json_response({'error': 'Failed to create reservation'}, status=409)
+    stays.append((check_in, check_out))
+    store.reservations.setdefault(email, []).append((int(form['room_id']), check_in, check_out))
+    raise web.HTTPFound('/hotels')
+
+
+@login_required
+async def reservations(request, email):
+    rows = request.app['store'].reservations.get(email, [])
+    return web.Response(text=''.join(f'<li>Room {room_id}: {start} - {end}</li>' for room_id, start, end in rows),
+                        content_type='text/html')
+
+
+@login_required
+async def index(request, email):
+    return web.Response(text='Welcome', content_type='text/html')
+
+
+def make_app(hotel_count=200, locations=('Bucharest',), latency=0.005, seed=None):
+    rng = random.Random(seed)
+
+    @web.middleware
+    async def delay(request, handler):
+        if latency > 0:
+            await asyncio.sleep(rng.expovariate(1 / latency))
+        return await handler(request)
+
+    app = web.Application(middlewares=[delay])
+    app['store'] = Store(hotel_count, list(locations), rng)
+    app.add_routes([
+        web.get('/', index),
+        web.post('/register', register),
+        web.post('/login', login),
+        web.get('/hotels', hotels),
+        web.post('/rooms/reserve', reserve),
+        web.get('/reservations', reservations),
+    ])
+    return app
+
+
+async def start(host='127.0.0.1', port=0, **kwargs):
+    """Serve the stand-in on the running loop; returns the runner and its base URL."""
+    runner = web.AppRunner(make_app(**kwargs), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_host, bound_port = runner.addresses[0][:2]
+    return runner, f'http://{bound_host}:{bound_port}'
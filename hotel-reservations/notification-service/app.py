@@ -1,12 +1,128 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
 from flask import Flask, request, jsonify
+from flask_opentracing import FlaskTracing
+from common.launcher import after_fork
+from common.metrics import init_metrics
+from common.tracing import initialize_tracer
 
 app = Flask(__name__)
+init_metrics(app)
+
+tracer = initialize_tracer("notification-service")
+flask_tracer = FlaskTracing(lambda: tracer, True, app)
+
+@after_fork
+def reset_tracer():
+    global tracer
+    tracer = initialize_tracer("notification-service")
+
+logger = logging.getLogger("notification-service")
+
+# Keys of sent notifications, so redelivered ones are not sent twice. Redis shares them
+# between every worker and replica; "memory" keeps them per process, for local runs.
+NOTIFY_DEDUP_BACKEND = os.getenv('NOTIFY_DEDUP_BACKEND', 'redis')
+NOTIFY_REDIS_URL = os.getenv('NOTIFY_REDIS_URL', 'redis://redis:6379/1')
+NOTIFY_DEDUP_TTL_SECONDS = int(os.getenv('NOTIFY_DEDUP_TTL_SECONDS', str(7 * 24 * 3600)))
+SENT_KEYS_SIZE = int(os.getenv('NOTIFY_DEDUP_SIZE', '100000'))
+
+class MemorySentKeys:
+    def __init__(self, size=SENT_KEYS_SIZE):
+        self.size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, keys):
+        claimed = []
+        with self._lock:
+            for key in keys:
+                if key in self._keys:
+                    self._keys.move_to_end(key)
+                    claimed.append(False)
+                    continue
+                self._keys[key] = True
+                if len(self._keys) > self.size:
+                    self._keys.popitem(last=False)
+                claimed.append(True)
+        return claimed
+
+    def release(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+class RedisSentKeys:
+    def __init__(self, url=NOTIFY_REDIS_URL, ttl=NOTIFY_DEDUP_TTL_SECONDS):
+        import redis
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def claim(self, keys):
+        # SET NX is atomic, so of two workers or replicas handed the same key only one claims it.
+        pipeline = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.set(f'notify:sent:{key}', 1, nx=True, ex=self.ttl)
+        return [bool(result) for result in pipeline.execute()]
+
+    def release(self, key):
+        self._client.delete(f'notify:sent:{key}')
+
+sent_keys = RedisSentKeys() if NOTIFY_DEDUP_BACKEND == 'redis' else MemorySentKeys()
+
+class DedupUnavailable(Exception):
+    pass
+
+@app.errorhandler(DedupUnavailable)
+def dedup_unavailable(e):
+    # Without the sent keys a redelivery could not be told apart, so let the sender retry.
+    return jsonify({'error': 'Deduplication store unavailable, try again'}), 503, {'Retry-After': '1'}
+
+def first_deliveries(keys):
+    """Claim each idempotency key; True where this is the first delivery. Items without a key always go out."""
+    wanted = list(dict.fromkeys(key for key in keys if key))
+    try:
+        claimed = dict(zip(wanted, sent_keys.claim(wanted))) if wanted else {}
+    except Exception as e:
+        logger.error("Cannot reach the notification dedup store: %s", e)
+        raise DedupUnavailable() from e
+    # pop: a key repeated within one request is only sent for its first item.
+    return [claimed.pop(key, False) if key else True for key in keys]
+
+def send_notification(data):
+    return f"Notification sent to {data['email']}"
+
+def deliver(items):
+    messages = []
+    for index, item in enumerate(items):
+        try:
+            messages.append(send_notification(item))
+        except Exception:
+            # These were claimed but not sent, so a retry must not treat them as duplicates.
+            for unsent in items[index:]:
+                if unsent.get('idempotency_key'):
+                    sent_keys.release(unsent['idempotency_key'])
+            raise
+    return messages
 
 @app.route('/notify', methods=['POST'])
 def notify():
     data = request.get_json()
-    return jsonify({'message': f"Notification sent to {data['email']}"}), 200
+    if not first_deliveries([data.get('idempotency_key')])[0]:
+        return jsonify({'message': f"Notification already sent to {data['email']}"}), 200
+    return jsonify({'message': deliver([data])[0]}), 200
+
+@app.route('/notify/batch', methods=['POST'])
+def notify_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get('notifications'), list):
+        return jsonify({'error': 'Invalid input'}), 400
+    if not all(isinstance(item, dict) and 'email' in item for item in data['notifications']):
+        return jsonify({'error': 'Invalid input'}), 400
+    firsts = first_deliveries([item.get('idempotency_key') for item in data['notifications']])
+    sent = deliver([item for item, first in zip(data['notifications'], firsts) if first])
+    return jsonify({'sent': len(sent), 'duplicates': len(data['notifications']) - len(sent)}), 200
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5005)
+    app.run(host='0.0.0.0', port=5005)
  
\ No newline at end of file
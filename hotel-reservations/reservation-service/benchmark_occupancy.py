@@ -0,0 +1,112 @@
+"""Compare the in-memory occupancy index with the SQL overlap query.
+
+Seeds a temporary reservation table with synthetic, non-overlapping stays,
+builds an OccupancyManager from it and times the same "which of these rooms
+are busy" lookups against both. Results are checked for equality.
+
+    DATABASE_URL=postgresql://... python benchmark_occupancy.py --rooms 2000 --stays-per-room 100
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+
+from occupancy import OccupancyManager
+
+BUSY_ROOMS_SQL = text(
+    "SELECT DISTINCT room_id FROM occupancy_benchmark "
+    "WHERE room_id = ANY(:room_ids) AND daterange(check_in, check_out) && daterange(:check_in, :check_out)"
+)
+
+
+def seed(conn, rooms, stays_per_room, origin):
+    conn.execute(text(
+        "CREATE TEMP TABLE occupancy_benchmark ("
+        "id serial PRIMARY KEY, room_id integer NOT NULL, check_in date NOT NULL, check_out date NOT NULL)"
+    ))
+    # Stay k of each room starts on day 7k and lasts one to six nights, so stays never overlap.
+    conn.execute(text(
+        "INSERT INTO occupancy_benchmark (room_id, check_in, check_out) "
+        "SELECT room_id, CAST(:origin AS date) + 7 * k, CAST(:origin AS date) + 7 * k + 1 + (random() * 5)::int "
+        "FROM generate_series(1, :rooms) room_id, generate_series(0, :stays - 1) k"
+    ), {'origin': origin, 'rooms': rooms, 'stays': stays_per_room})
+    conn.execute(text("CREATE INDEX ON occupancy_benchmark (room_id)"))
+    conn.execute(text("CREATE INDEX ON occupancy_benchmark USING gist (daterange(check_in, check_out))"))
+    conn.execute(text("ANALYZE occupancy_benchmark"))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, samples):
+    millis = [sample * 1000 for sample in samples]
+    print(f"{name:>6}: mean {statistics.mean(millis):8.3f} ms  p50 {percentile(millis, 0.5):8.3f} ms  "
+          f"p99 {percentile(millis, 0.99):8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--stays-per-room', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--candidates', type=int, default=500, help='rooms checked per query')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    engine = create_engine(os.environ['DATABASE_URL'])
+    history_days = 30
+    origin = date.today() - timedelta(days=history_days)
+    horizon_days = 7 * args.stays_per_room
+
+    with engine.connect() as conn:
+        seed(conn, args.rooms, args.stays_per_room, origin)
+        total = conn.execute(text("SELECT count(*) FROM occupancy_benchmark")).scalar()
+        print(f"Seeded {total} reservations for {args.rooms} rooms")
+
+        def load_changes(cursor):
+            return None, conn.execute(text("SELECT id, room_id, check_in, check_out FROM occupancy_benchmark")), []
+
+        manager = OccupancyManager(load_changes, history_days=history_days, horizon_days=horizon_days,
+                                   sync_seconds=float('inf'), rebuild_seconds=float('inf'))
+        started = time.perf_counter()
+        manager.rebuild()
+        print(f"Built occupancy index in {time.perf_counter() - started:.2f} s")
+
+        queries = []
+        for _ in range(args.queries):
+            check_in = origin + timedelta(days=random.randrange(history_days, history_days + horizon_days - 14))
+            check_out = check_in + timedelta(days=random.randint(1, 14))
+            room_ids = random.sample(range(1, args.rooms + 1), min(args.candidates, args.rooms))
+            queries.append((room_ids, check_in, check_out))
+
+        sql_samples, index_samples = [], []
+        for room_ids, check_in, check_out in queries:
+            started = time.perf_counter()
+            from_sql = {row[0] for row in conn.execute(BUSY_ROOMS_SQL, {
+                'room_ids': room_ids, 'check_in': check_in, 'check_out': check_out
+            })}
+            sql_samples.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            from_index = manager.busy_rooms(room_ids, check_in, check_out)
+            index_samples.append(time.perf_counter() - started)
+
+            if from_sql != from_index:
+                raise SystemExit(f"Mismatch for {check_in}..{check_out}: "
+                                 f"{len(from_sql ^ from_index)} rooms differ")
+
+    print(f"{args.queries} queries, {args.candidates} candidate rooms each, results identical")
+    report('sql', sql_samples)
+    report('index', index_samples)
+    print(f"speedup: {statistics.mean(sql_samples) / statistics.mean(index_samples):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import random
+import time
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# Serialization failures, deadlocks and lock timeouts; the transaction can simply be run again.
+RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+
+booking_lock_wait_seconds = Histogram('booking_lock_wait_seconds', 'Time spent waiting for a room lock')
+booking_retries_total = Counter('booking_retries_total', 'Booking transactions retried after a transient conflict', ['pgcode'])
+booking_contention_total = Counter('booking_contention_total', 'Bookings that gave up after exhausting their retries')
+
+
+class BookingContention(Exception):
+    pass
+
+
+def pgcode(error):
+    return getattr(getattr(error, 'orig', None), 'pgcode', None)
+
+
+def lock_room(session, room_id, timeout_ms):
+    """Take a transaction-scoped advisory lock on ``room_id``.
+
+    Only bookings of the same room wait for each other; the lock is released
+    when the transaction commits or rolls back.
+    """
+    started = time.perf_counter()
+    session.execute(text("SELECT set_config('lock_timeout', :timeout, true)"), {'timeout': f'{int(timeout_ms)}ms'})
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('reservation-room'), :room_id)"), {'room_id': room_id})
+    booking_lock_wait_seconds.observe(time.perf_counter() - started)
+
+
+def run_booking(session, attempt, max_retries=3, backoff=0.02):
+    """Run ``attempt`` as one transaction, retrying it after transient conflicts.
+
+    ``attempt`` must start from a clean session and either commit or raise.
+    Raises ``BookingContention`` once the retries are used up.
+    """
+    for retry in range(max_retries + 1):
+        try:
+            return attempt()
+        except DBAPIError as e:
+            session.rollback()
+            code = pgcode(e)
+            if code not in RETRYABLE_PGCODES:
+                raise
+            if retry == max_retries:
+                booking_contention_total.inc()
+                raise BookingContention(code) from e
+            booking_retries_total.labels(code).inc()
+            time.sleep(random.uniform(0, backoff * 2 ** retry))
@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+WORD_BITS = 64
+
+logger = logging.getLogger("reservation-service.occupancy")
+
+
+class OccupancyIndex:
+    """Per-room day bitmaps covering a fixed window of days.
+
+    Each room owns one row of a ``uint64`` matrix; bit ``d`` of a row is set when
+    the room is occupied on night ``origin + d``. Stays are half-open
+    ``[check_in, check_out)`` intervals, like the database daterange, and are
+    kept per reservation id so a moved or deleted reservation can be replaced.
+    """
+
+    def __init__(self, origin, days):
+        self.origin = origin
+        self.days = days
+        self.words = (days + WORD_BITS - 1) // WORD_BITS
+        self._slots = {}
+        self._bits = np.zeros((64, self.words), dtype=np.uint64)
+        self._periods = {}
+        self._room_reservations = {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def covers(self, check_in, check_out):
+        return self.origin <= check_in and (check_out - self.origin).days <= self.days
+
+    def _day_range(self, check_in, check_out):
+        start = max((check_in - self.origin).days, 0)
+        end = min((check_out - self.origin).days, self.days)
+        return start, end
+
+    def _masks(self, start, end):
+        first_word, last_word = start // WORD_BITS, (end - 1) // WORD_BITS
+        masks = []
+        for word in range(first_word, last_word + 1):
+            low = max(start, word * WORD_BITS) - word * WORD_BITS
+            high = min(end, (word + 1) * WORD_BITS) - word * WORD_BITS
+            masks.append(((1 << (high - low)) - 1) << low)
+        return first_word, last_word + 1, np.array(masks, dtype=np.uint64)
+
+    def _slot(self, room_id):
+        slot = self._slots.get(room_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._bits):
+                self._bits = np.vstack([self._bits, np.zeros_like(self._bits)])
+            self._slots[room_id] = slot
+        return slot
+
+    def _set(self, room_id, start, end):
+        slot = self._slot(room_id)
+        first, last, masks = self._masks(start, end)
+        self._bits[slot, first:last] |= masks
+
+    def put(self, reservation_id, room_id, check_in, check_out):
+        """Record the stay of a reservation, replacing the one recorded before."""
+        self.drop(reservation_id)
+        start, end = self._day_range(check_in, check_out)
+        if start >= end:
+            return
+        self._periods[reservation_id] = (room_id, start, end)
+        self._room_reservations.setdefault(room_id, set()).add(reservation_id)
+        self._set(room_id, start, end)
+
+    def drop(self, reservation_id):
+        period = self._periods.pop(reservation_id, None)
+        if period is None:
+            return
+        room_id, start, end = period
+        others = self._room_reservations[room_id]
+        others.discard(reservation_id)
+        first, last, masks = self._masks(start, end)
+        self._bits[self._slots[room_id], first:last] &= ~masks
+        # Another stay may already hold some of these nights if its change was seen first.
+        for other_id in others:
+            _, other_start, other_end = self._periods[other_id]
+            if other_start < end and start < other_end:
+                self._set(room_id, other_start, other_end)
+
+    def busy_rooms(self, room_ids, check_in, check_out):
+        """Return the subset of ``room_ids`` with any occupied night in the range."""
+        start, end = self._day_range(check_in, check_out)
+        known = [room_id for room_id in room_ids if room_id in self._slots]
+        if start >= end or not known:
+            return set()
+        first, last, masks = self._masks(start, end)
+        rows = self._bits[[self._slots[room_id] for room_id in known], first:last]
+        hits = np.bitwise_and(rows, masks).any(axis=1)
+        return {room_id for room_id, hit in zip(known, hits) if hit}
+
+    def is_busy(self, room_id, check_in, check_out):
+        return bool(self.busy_rooms([room_id], check_in, check_out))
+
+    def differences(self, other):
+        """Room ids whose bitmaps differ between two indexes over the same window."""
+        mismatched = []
+        for room_id in set(self._slots) | set(other._slots):
+            mine = self._row(room_id)
+            theirs = other._row(room_id)
+            if not np.array_equal(mine, theirs):
+                mismatched.append(room_id)
+        return sorted(mismatched)
+
+    def _row(self, room_id):
+        slot = self._slots.get(room_id)
+        if slot is None:
+            return np.zeros(self.words, dtype=np.uint64)
+        return self._bits[slot]
+
+
+class OccupancyManager:
+    """Keeps an ``OccupancyIndex`` in step with the reservation table.
+
+    ``ensure_started`` starts a thread that builds the index and then applies,
+    every ``sync_seconds``, the reservations inserted, updated or deleted since
+    the previous pass by any replica. It also rebuilds the whole index every
+    ``rebuild_seconds``. Lookups fall back to SQL until the first build is done.
+    Local writes are applied immediately. The database constraint stays the
+    authority on double bookings.
+
+    ``load_changes(cursor)`` returns ``(next_cursor, rows, deleted_ids)``, where
+    rows are ``(id, room_id, check_in, check_out)`` tuples: every reservation
+    when ``cursor`` is ``None``, otherwise those written since the load that
+    returned ``cursor``, together with the ids deleted since.
+    """
+
+    def __init__(self, load_changes, history_days=30, horizon_days=730, sync_seconds=5, rebuild_seconds=600):
+        self.load_changes = load_changes
+        self.history_days = history_days
+        self.horizon_days = horizon_days
+        self.sync_seconds = sync_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self._index = None
+        self._cursor = None
+        self._built_at = 0
+        self._journal = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def ensure_started(self):
+        # A thread started before fork does not exist in the worker, so each process starts its own.
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Locks held by the parent's threads at fork would never be released here. An index
+            # forked halfway through an update is dropped; a rebuild in progress is restarted.
+            if self._lock.locked():
+                self._index = None
+            self._journal = None
+            self._lock = threading.Lock()
+            self._refresh_lock = threading.Lock()
+            self._start_lock = threading.Lock()
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='occupancy-sync', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                if self._index is None or time.monotonic() - self._built_at > self.rebuild_seconds:
+                    self.rebuild()
+                else:
+                    self.sync()
+            except Exception:
+                logger.exception("Occupancy index refresh failed")
+            time.sleep(self.sync_seconds)
+
+    def _build(self, origin=None):
+        index = OccupancyIndex(origin or date.today() - timedelta(days=self.history_days),
+                               self.history_days + self.horizon_days)
+        cursor, rows, _ = self.load_changes(None)
+        for reservation_id, room_id, check_in, check_out in rows:
+            index.put(reservation_id, room_id, check_in, check_out)
+        return index, cursor
+
+    def rebuild(self):
+        with self._refresh_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                index, cursor = self._build()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                for method, args in self._journal:
+                    getattr(index, method)(*args)
+                self._journal = None
+                self._index = index
+                self._cursor = cursor
+                self._built_at = time.monotonic()
+            return index
+
+    def sync(self):
+        """Apply the reservations written or deleted since the last build or sync."""
+        with self._refresh_lock:
+            if self._index is None:
+                return
+            cursor, rows, deleted_ids = self.load_changes(self._cursor)
+            rows = list(rows)
+            with self._lock:
+                for row in rows:
+                    self._apply('put', tuple(row))
+                for reservation_id in deleted_ids:
+                    self._apply('drop', (reservation_id,))
+                self._cursor = cursor
+
+    def _apply(self, method, args):
+        if self._index is not None:
+            getattr(self._index, method)(*args)
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def record(self, reservation_id, room_id, check_in, check_out):
+        with self._lock:
+            self._apply('put', (reservation_id, room_id, check_in, check_out))
+
+    def forget(self, reservation_id):
+        with self._lock:
+            self._apply('drop', (reservation_id,))
+
+    def busy_rooms(self, room_ids, check_in, check_out):
+        """Busy subset of ``room_ids``, or ``None`` when the index is not built yet or the range is outside it."""
+        with self._lock:
+            index = self._index
+            if index is None or not index.covers(check_in, check_out):
+                return None
+            return index.busy_rooms(room_ids, check_in, check_out)
+
+    def verify(self):
+        """Compare the live index with one freshly built from the database.
+
+        Returns the ids of rooms whose occupancy differs; an empty list means the
+        index is consistent.
+        """
+        current = self._index or self.rebuild()
+        fresh, _ = self._build(current.origin)
+        with self._lock:
+            return fresh.differences(current)
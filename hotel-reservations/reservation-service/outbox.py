@@ -0,0 +1,171 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from prometheus_client import Counter
+from sqlalchemy import text
+
+logger = logging.getLogger("reservation-service.outbox")
+
+outbox_delivered_total = Counter('outbox_delivered_total', 'Outbox messages delivered', ['topic'])
+outbox_failures_total = Counter('outbox_failures_total', 'Outbox delivery attempts that failed', ['topic'])
+outbox_dead_total = Counter('outbox_dead_total', 'Outbox messages given up on after too many attempts', ['topic'])
+
+CLAIM_SQL = (
+    "SELECT id, topic, payload FROM outbox_message "
+    "WHERE delivered_at IS NULL AND attempts < :max_attempts AND available_at <= now() "
+    "ORDER BY id LIMIT :limit FOR UPDATE SKIP LOCKED"
+)
+DELIVERED_SQL = (
+    "UPDATE outbox_message SET delivered_at = now(), attempts = attempts + 1, last_error = NULL "
+    "WHERE id = ANY(:ids)"
+)
+FAILED_SQL = (
+    "UPDATE outbox_message SET attempts = attempts + 1, last_error = :error, "
+    "available_at = now() + least(:backoff * power(2, attempts), :max_backoff) * interval '1 second' "
+    "WHERE id = ANY(:ids) RETURNING attempts"
+)
+PURGE_SQL = "DELETE FROM outbox_message WHERE delivered_at < now() - :retention * interval '1 second'"
+
+
+class HttpTransport:
+    """Posts a whole batch of payloads to one endpoint of a downstream service.
+
+    The receiving endpoint must be idempotent: a batch whose response was lost
+    is delivered again.
+    """
+
+    def __init__(self, client, path, key):
+        self.client = client
+        self.path = path
+        self.key = key
+
+    def deliver(self, payloads):
+        response = self.client.post(self.path, json={self.key: payloads})
+        response.raise_for_status()
+
+
+class InMemoryTransport:
+    """Stand-in transport for tests and local runs; keeps every delivered payload.
+
+    Set ``failures`` to make that many upcoming deliveries raise.
+    """
+
+    def __init__(self):
+        self.delivered = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def deliver(self, payloads):
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("simulated delivery failure")
+            self.delivered.extend(payloads)
+
+
+def memory_transports(topics):
+    return {topic: InMemoryTransport() for topic in topics}
+
+
+class OutboxDispatcher:
+    """Delivers messages written to ``outbox_message`` by the request handlers.
+
+    A background thread claims up to ``batch_size`` pending rows with ``FOR
+    UPDATE SKIP LOCKED``, so every worker and replica can dispatch without two
+    of them sending the same message, and hands each topic's payloads to its
+    transport in one call. Failed batches are retried with exponential backoff
+    until ``max_attempts``; delivered rows are purged after ``retention_seconds``.
+    Delivery is at least once, so receivers deduplicate.
+    """
+
+    def __init__(self, engine, transports, batch_size=100, poll_interval=1.0, max_attempts=10,
+                 backoff_seconds=1.0, max_backoff_seconds=300.0, retention_seconds=86400):
+        self.engine = engine
+        self.transports = transports
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retention_seconds = retention_seconds
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # A thread started before fork does not exist in the worker, so each process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wake = threading.Event()
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+
+    def dispatch_once(self):
+        """Claim and deliver one batch; returns the number of messages claimed."""
+        with self.engine.begin() as conn:
+            rows = conn.execute(text(CLAIM_SQL), {
+                'max_attempts': self.max_attempts, 'limit': self.batch_size
+            }).all()
+            batches = defaultdict(list)
+            for message_id, topic, payload in rows:
+                batches[topic].append((message_id, payload))
+            for topic, messages in batches.items():
+                ids = [message_id for message_id, _ in messages]
+                try:
+                    self.transports[topic].deliver([payload for _, payload in messages])
+                except Exception as e:
+                    self._failed(conn, topic, ids, e)
+                else:
+                    conn.execute(text(DELIVERED_SQL), {'ids': ids})
+                    outbox_delivered_total.labels(topic).inc(len(ids))
+        return len(rows)
+
+    def _failed(self, conn, topic, ids, error):
+        outbox_failures_total.labels(topic).inc(len(ids))
+        attempts = conn.execute(text(FAILED_SQL), {
+            'ids': ids, 'error': f"{type(error).__name__}: {error}"[:1000],
+            'backoff': self.backoff_seconds, 'max_backoff': self.max_backoff_seconds
+        }).scalars().all()
+        dead = sum(1 for count in attempts if count >= self.max_attempts)
+        if dead:
+            outbox_dead_total.labels(topic).inc(dead)
+            logger.error("Giving up on %d %s outbox messages after %d attempts: %s",
+                         dead, topic, self.max_attempts, error)
+        else:
+            logger.warning("Delivering %d %s outbox messages failed: %s", len(ids), topic, error)
+
+    def purge(self):
+        with self.engine.begin() as conn:
+            return conn.execute(text(PURGE_SQL), {'retention': self.retention_seconds}).rowcount
+
+    def _run(self):
+        passes = 0
+        while not self._stopped.is_set():
+            try:
+                claimed = self.dispatch_once()
+                passes += 1
+                if passes % 600 == 0:
+                    self.purge()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
@@ -0,0 +1,143 @@
+"""Hammer POST /reservations on hot and cold rooms at the same time.
+
+Hot requests compete for a few rooms over a short window of dates, so most of
+them conflict; cold requests spread over many rooms and dates and should run
+at full speed alongside. Afterwards every room's reservations are read back
+and checked for overlapping stays.
+
+    python stress_booking.py --url http://localhost:5003 --user-id 1 --hot-rooms 1,2 --cold-rooms 3-40
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import requests
+
+DATE_FORMAT = "%d-%m-%Y"
+
+
+def parse_rooms(value):
+    rooms = []
+    for part in value.split(','):
+        first, _, last = part.partition('-')
+        rooms.extend(range(int(first), int(last or first) + 1))
+    return rooms
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Stress:
+    def __init__(self, args):
+        self.args = args
+        self.local = threading.local()
+        self.results = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def book(self, kind, room_id, window_days):
+        start = self.args.origin + timedelta(days=random.randrange(window_days))
+        nights = random.randint(1, 4)
+        body = {
+            'user_id': self.args.user_id,
+            'room_id': room_id,
+            'check_in': start.strftime(DATE_FORMAT),
+            'check_out': (start + timedelta(days=nights)).strftime(DATE_FORMAT),
+        }
+        started = time.perf_counter()
+        try:
+            status = self.session().post(f"{self.args.url}/reservations", json=body, timeout=30).status_code
+        except requests.RequestException:
+            status = 'error'
+        with self.lock:
+            self.results[kind].append((status, time.perf_counter() - started))
+
+    def run(self):
+        args = self.args
+        jobs = []
+        for _ in range(args.requests):
+            if random.random() < args.hot_share:
+                jobs.append(('hot', random.choice(args.hot_rooms), args.hot_window))
+            else:
+                jobs.append(('cold', random.choice(args.cold_rooms), args.cold_window))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for job in jobs:
+                executor.submit(self.book, *job)
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        print(f"{self.args.requests} requests in {elapsed:.2f} s ({self.args.requests / elapsed:.1f} req/s)")
+        for kind, results in sorted(self.results.items()):
+            statuses = Counter(status for status, _ in results)
+            millis = [duration * 1000 for _, duration in results]
+            print(f"{kind:>5}: {len(results)} requests, {statuses.get(201, 0)} booked, "
+                  f"{statuses.get(409, 0)} conflicts, {statuses.get(503, 0)} gave up, "
+                  f"other {dict((k, v) for k, v in statuses.items() if k not in (201, 409, 503))}; "
+                  f"mean {statistics.mean(millis):.1f} ms p50 {percentile(millis, 0.5):.1f} ms "
+                  f"p99 {percentile(millis, 0.99):.1f} ms; {statuses.get(201, 0) / elapsed:.1f} bookings/s")
+
+    def double_bookings(self, room_ids):
+        overlaps = []
+        for room_id in room_ids:
+            stays = []
+            after_id = None
+            while True:
+                params = {'room_id': room_id, 'limit': 1000}
+                if after_id is not None:
+                    params['after_id'] = after_id
+                page = requests.get(f"{self.args.url}/reservations", params=params, timeout=30).json()
+                stays.extend(page['items'])
+                after_id = page['next_after_id']
+                if after_id is None:
+                    break
+            periods = sorted(
+                (datetime.strptime(stay['check_in'], DATE_FORMAT), datetime.strptime(stay['check_out'], DATE_FORMAT), stay['id'])
+                for stay in stays
+            )
+            for previous, current in zip(periods, periods[1:]):
+                if current[0] < previous[1]:
+                    overlaps.append((room_id, previous[2], current[2]))
+        return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5003')
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--hot-rooms', type=parse_rooms, required=True, help='e.g. 1,2')
+    parser.add_argument('--cold-rooms', type=parse_rooms, required=True, help='e.g. 3-40')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--hot-share', type=float, default=0.5, help='fraction of requests for hot rooms')
+    parser.add_argument('--hot-window', type=int, default=14, help='days hot requests start within')
+    parser.add_argument('--cold-window', type=int, default=3000, help='days cold requests start within')
+    parser.add_argument('--origin', type=lambda value: datetime.strptime(value, DATE_FORMAT).date(),
+                        default=date.today() + timedelta(days=365), help='first check-in date, DD-MM-YYYY')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    stress = Stress(args)
+    elapsed = stress.run()
+    stress.report(elapsed)
+    overlaps = stress.double_bookings(sorted(set(args.hot_rooms) | set(args.cold_rooms)))
+    print(f"double bookings: {len(overlaps)}")
+    for room_id, first, second in overlaps[:20]:
+        print(f"  room {room_id}: reservations {first} and {second} overlap")
+    raise SystemExit(1 if overlaps else 0)
+
+
+if __name__ == '__main__':
+    main()
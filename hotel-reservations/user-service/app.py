@@ -1,25 +1,35 @@
 import os
-import bcrypt
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from prometheus_client import Counter, generate_latest
+from flask_opentracing import FlaskTracing
+from common.cache import InvalidationBroadcaster
+from common.launcher import after_fork
+from common.metrics import init_metrics
+from common.migrations import Migration, QueryPlan, init_migrations
+from common.pagination import paginate
+from common.tracing import initialize_tracer
+from passwords import PasswordHasher, PasswordPoolBusy, password_rehashes_total
 
 app = Flask(__name__)
 
-http_requests_total = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint'])
-
-@app.before_request
-def before_request():
-    http_requests_total.labels(request.method, request.endpoint).inc()
-
-@app.route('/metrics', methods=['GET'])
-def metrics():
-    return Response(generate_latest(), mimetype='text/plain')
-
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
+init_metrics(app, db)
+
+passwords = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', '12')),
+    workers=int(os.getenv('PASSWORD_WORKERS', str(os.cpu_count() or 2))),
+    max_queue=int(os.getenv('PASSWORD_MAX_QUEUE', '16')),
+    timeout=float(os.getenv('PASSWORD_TIMEOUT', '10')),
+)
+
+@app.errorhandler(PasswordPoolBusy)
+def password_pool_busy(error):
+    response = jsonify({"error": "Too many password operations in progress, retry shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -27,8 +37,28 @@ class User(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(100), nullable=False)
 
-with app.app_context():
-    db.create_all()
+MIGRATIONS = [
+    Migration(1, 'create tables', lambda conn: db.metadata.create_all(conn)),
+]
+
+HOT_QUERIES = [
+    QueryPlan('user by email', 'SELECT * FROM "user" WHERE email = :email', {'email': 'admin@admin.com'}),
+]
+
+init_migrations(app, db, 'user-service', MIGRATIONS, HOT_QUERIES)
+
+tracer = initialize_tracer("user-service")
+flask_tracer = FlaskTracing(lambda: tracer, True, app)
+
+@after_fork
+def reset_after_fork():
+    # The tracer's reporter thread and the pooled connections do not survive fork.
+    global tracer
+    tracer = initialize_tracer("user-service")
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+cache_invalidation = InvalidationBroadcaster()
 
 @app.route('/')
 def index():
@@ -40,18 +70,21 @@ def create_user():
     if not data or 'name' not in data or 'email' not in data or 'password' not in data:
         return jsonify({"error": "Invalid input"}), 400
 
-    hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-
-    new_user = User(name=data['name'], email=data['email'], password=hashed_password.decode('utf-8'))
+    new_user = User(name=data['name'], email=data['email'], password=passwords.hash(data['password']))
     db.session.add(new_user)
     db.session.commit()
     return jsonify({"message": "User created successfully"}), 201
 
 @app.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    user_list = [{"id": user.id, "name": user.name, "email": user.email} for user in users]
-    return jsonify(user_list), 200
+    query = User.query
+    if 'email' in request.args:
+        query = query.filter_by(email=request.args['email'])
+    try:
+        page = paginate(query, User.id, lambda user: {"id": user.id, "name": user.name, "email": user.email}, request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+    return jsonify(page), 200
 
 @app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -60,6 +93,15 @@ def get_user(user_id):
         return jsonify({"error": "User not found"}), 404
     return jsonify({"id": user.id, "name": user.name, "email": user.email}), 200
 
+@app.route('/users/batch', methods=['GET'])
+def get_users_batch():
+    try:
+        user_ids = [int(user_id) for user_id in request.args.get('ids', '').split(',') if user_id]
+    except ValueError:
+        return jsonify({"error": "Invalid user ids"}), 400
+    users = User.query.filter(User.id.in_(user_ids)).all() if user_ids else []
+    return jsonify([{"id": user.id, "name": user.name, "email": user.email} for user in users]), 200
+
 @app.route('/users/email/<string:email>', methods=['GET'])
 def get_user_by_email(email):
     user = User.query.filter_by(email=email).first()
@@ -74,6 +116,7 @@ def delete_user(user_id):
         return jsonify({"error": "User not found"}), 404
     db.session.delete(user)
     db.session.commit()
+    cache_invalidation.publish('users', user_id)
     return jsonify({"message": "User deleted successfully"}), 200
 
 @app.route('/users/<int:user_id>', methods=['PUT'])
@@ -87,17 +130,24 @@ def update_user(user_id):
     if 'email' in data:
         user.email = data['email']
     if 'password' in data:
-        hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-        user.password = hashed_password.decode('utf-8')
+        user.password = passwords.hash(data['password'])
     db.session.commit()
+    cache_invalidation.publish('users', user_id)
     return jsonify({"message": "User updated successfully"}), 200
 
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
-    if user and bcrypt.checkpw(data['password'].encode('utf-8'), user.password.encode('utf-8')):
-        return jsonify({"message": "Login successful"}), 200
+    if user and passwords.check(data['password'], user.password):
+        if passwords.needs_rehash(user.password):
+            try:
+                user.password = passwords.hash(data['password'])
+                db.session.commit()
+                password_rehashes_total.inc()
+            except PasswordPoolBusy:
+                pass  # the upgrade is retried on the next login
+        return jsonify({"message": "Login successful", "id": user.id}), 200
     return jsonify({"error": "Invalid email or password"}), 401
 
 if __name__ == '__main__':
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+from prometheus_client import Counter, Gauge, Histogram
+
+password_hash_duration = Histogram('password_hash_duration_seconds', 'Time spent on password hashing and checks, including queueing', ['operation'])
+password_queue_depth = Gauge('password_queue_depth', 'Password operations queued or running in the pool', multiprocess_mode='livesum')
+password_rejections_total = Counter('password_rejections_total', 'Password operations rejected because the pool was saturated', ['operation'])
+password_rehashes_total = Counter('password_rehashes_total', 'Stored hashes upgraded to the configured cost on login')
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+class PasswordHasher:
+    """Runs bcrypt in a separate process pool so request threads never spend CPU on it.
+
+    At most ``max_queue`` operations may be queued or running at once; beyond that
+    requests fail fast with ``PasswordPoolBusy`` instead of piling up behind the
+    pool and holding their web worker.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_queue=8, timeout=10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        # A pool inherited through fork has no live workers, so each process makes its own.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            password_rejections_total.labels(operation).inc()
+            raise PasswordPoolBusy(operation)
+        password_queue_depth.inc()
+        started = time.perf_counter()
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the pool is done with the operation, not until this
+        # request gives up on it, so timed-out work still counts against max_queue.
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            password_rejections_total.labels(operation).inc()
+            raise PasswordPoolBusy(operation)
+        finally:
+            password_hash_duration.labels(operation).observe(time.perf_counter() - started)
+
+    def _release(self, future=None):
+        password_queue_depth.dec()
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run('hash', _hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        return self._run('check', _check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        # bcrypt hashes look like $2b$<cost>$<salt+digest>.
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True